@@ -0,0 +1,61 @@
+# Diffuse: a graphical tool for merging and comparing text files.
+#
+# Copyright (C) 2019 Derrick Moser <derrick_moser@yahoo.com>
+# Copyright (C) 2021 Romain Failliot <romain.failliot@foolstep.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import time
+
+from abc import ABCMeta, abstractmethod
+from typing import List, Optional, Sequence, Tuple
+
+
+class BudgetExceeded(Exception):
+    """Raised by a diff engine when it runs out of time."""
+
+
+class DiffBudget:
+    """Limits the time the diff engines may spend aligning lines."""
+
+    def __init__(self, seconds: Optional[float] = None) -> None:
+        """No limit is imposed if 'seconds' is None."""
+        self.deadline = None if seconds is None else time.monotonic() + seconds
+        self.exceeded = False
+
+    def check(self) -> None:
+        """Raises BudgetExceeded once the time limit has been reached."""
+        if self.deadline is not None and (self.exceeded or time.monotonic() > self.deadline):
+            self.exceeded = True
+            raise BudgetExceeded()
+
+    def cancel(self) -> None:
+        """Makes the next call to check() raise BudgetExceeded."""
+        self.deadline = 0.0
+
+
+class DiffEngineInterface(metaclass=ABCMeta):
+    """Interface for the algorithms used to align lines."""
+
+    # matching blocks are described by (idx_a, idx_b, n) tuples
+    Match = Tuple[int, int, int]
+    MatchList = List[Match]
+
+    @abstractmethod
+    def diff(self, a: Sequence[int], b: Sequence[int], budget: DiffBudget) -> MatchList:
+        """Returns the blocks of matching elements of 'a' and 'b' ordered by
+           position.  The list is terminated by a zero length block located
+           at (len(a), len(b)).  BudgetExceeded is raised if the engine runs
+           out of time."""
@@ -0,0 +1,70 @@
+# Diffuse: a graphical tool for merging and comparing text files.
+#
+# Copyright (C) 2019 Derrick Moser <derrick_moser@yahoo.com>
+# Copyright (C) 2021 Romain Failliot <romain.failliot@foolstep.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+from typing import List, Sequence
+
+from diffuse.diffengines.engine_interface import BudgetExceeded, DiffBudget, DiffEngineInterface
+from diffuse.diffengines.histogram import Histogram
+from diffuse.diffengines.myers import Myers
+from diffuse.diffengines.patience import Patience, anchor_diff
+
+
+class DiffEngineRegistry:
+    # the engine used when none or an unknown one is requested
+    DEFAULT = 'patience'
+
+    def __init__(self) -> None:
+        # initialise the diff engines
+        self._engines = {
+            'histogram': Histogram(),
+            'myers': Myers(),
+            'patience': Patience()
+        }
+
+    # returns the names of the available diff engines
+    def getNames(self) -> List[str]:
+        return sorted(self._engines)
+
+    # returns the named diff engine falling back to the default one
+    def getEngine(self, name: str) -> DiffEngineInterface:
+        engine = self._engines.get(name)
+        if engine is None:
+            engine = self._engines[self.DEFAULT]
+        return engine
+
+    # finds the matching blocks of 'a' and 'b' using the named diff engine
+    #
+    # If the budget is exceeded, the result is approximated by only matching
+    # lines around those that are unique to both 'a' and 'b'.  The caller can
+    # inspect budget.exceeded to find out whether this happened.
+    def diff(
+            self,
+            name: str,
+            a: Sequence[int],
+            b: Sequence[int],
+            budget: DiffBudget) -> DiffEngineInterface.MatchList:
+        if not budget.exceeded:
+            try:
+                return self.getEngine(name).diff(a, b, budget)
+            except BudgetExceeded:
+                pass
+        return anchor_diff(a, b)
+
+
+theDiffEngines = DiffEngineRegistry()
@@ -0,0 +1,102 @@
+# Diffuse: a graphical tool for merging and comparing text files.
+#
+# Copyright (C) 2019 Derrick Moser <derrick_moser@yahoo.com>
+# Copyright (C) 2021 Romain Failliot <romain.failliot@foolstep.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from diffuse.diffengines.engine_interface import DiffBudget, DiffEngineInterface
+from diffuse.diffengines.myers import _finish_matches, _myers_matches
+
+# elements occurring more often than this are not used to split sections
+_MAX_CHAIN_LENGTH = 64
+
+
+# histogram diff
+#
+# Sections are recursively split around the longest matching region
+# containing the least frequently occurring elements.  Sections without any
+# suitable element are handled using Myers' algorithm.
+class Histogram(DiffEngineInterface):
+    def diff(
+            self,
+            a: Sequence[int],
+            b: Sequence[int],
+            budget: DiffBudget) -> DiffEngineInterface.MatchList:
+        matches: DiffEngineInterface.MatchList = []
+        blocks = [(0, len(a), 0, len(b))]
+        while blocks:
+            budget.check()
+            start_a, end_a, start_b, end_b = blocks.pop()
+            if start_a < end_a and start_b < end_b:
+                region = _find_region(a, start_a, end_a, b, start_b, end_b)
+                if region is None:
+                    _myers_matches(a, start_a, end_a, b, start_b, end_b, matches, budget)
+                else:
+                    idx_a, idx_b, n = region
+                    matches.append(region)
+                    blocks.append((idx_a + n, end_a, idx_b + n, end_b))
+                    blocks.append((start_a, idx_a, start_b, idx_b))
+        return _finish_matches(matches, len(a), len(b))
+
+
+# finds the longest region common to a[start_a:end_a] and b[start_b:end_b]
+# whose least frequent element in 'a' occurs the fewest number of times
+def _find_region(
+        a: Sequence[int],
+        start_a: int,
+        end_a: int,
+        b: Sequence[int],
+        start_b: int,
+        end_b: int) -> Optional[Tuple[int, int, int]]:
+    # histogram of the elements of 'a'
+    occurrences: Dict[int, List[int]] = {}
+    for i in range(start_a, end_a):
+        s = a[i]
+        if s in occurrences:
+            occurrences[s].append(i)
+        else:
+            occurrences[s] = [i]
+    result = None
+    max_count = _MAX_CHAIN_LENGTH + 1
+    best_n = 0
+    idx_b = start_b
+    while idx_b < end_b:
+        next_b = idx_b + 1
+        positions = occurrences.get(b[idx_b])
+        if positions is not None and len(positions) <= max_count:
+            for idx_a in positions:
+                count = len(positions)
+                # extend the region before and after, keeping track of the
+                # least frequent element
+                sa, sb = idx_a, idx_b
+                while start_a < sa and start_b < sb and a[sa - 1] == b[sb - 1]:
+                    sa -= 1
+                    sb -= 1
+                    count = min(count, len(occurrences[a[sa]]))
+                ea, eb = idx_a + 1, idx_b + 1
+                while ea < end_a and eb < end_b and a[ea] == b[eb]:
+                    count = min(count, len(occurrences[a[ea]]))
+                    ea += 1
+                    eb += 1
+                if ea - sa > best_n or count < max_count:
+                    result = (sa, sb, ea - sa)
+                    best_n, max_count = ea - sa, count
+                # skip over the elements of 'b' in this region
+                next_b = max(next_b, eb)
+        idx_b = next_b
+    return result
@@ -0,0 +1,202 @@
+# Diffuse: a graphical tool for merging and comparing text files.
+#
+# Copyright (C) 2019 Derrick Moser <derrick_moser@yahoo.com>
+# Copyright (C) 2021 Romain Failliot <romain.failliot@foolstep.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import difflib
+import re
+
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+
+from diffuse.diffengines.engine_interface import DiffEngineInterface
+from diffuse.diffengines.patience import anchor_diff
+
+# differing sections longer than this many characters (both lines combined)
+# are compared token by token instead of character by character
+CHAR_DIFF_THRESHOLD = 4000
+
+# largest product of the number of tokens in each differing section that is
+# compared with difflib, larger sections only match tokens around anchors
+# that are unique to both lines
+MAX_TOKEN_DIFF_COST = 1000000
+
+# largest sum of the products of the number of characters in each pair of
+# sections between matching tokens that are refined with difflib for a line,
+# the remaining sections are left as coarse differences
+MAX_CHAR_DIFF_COST = 4000000
+
+# number of line pairs whose results are remembered
+CACHE_SIZE = 512
+
+# largest total number of characters of the line pairs whose results are
+# remembered
+CACHE_CHARS = 4 * 1024 * 1024
+
+# ASCII words, runs of white space and any other single characters
+_TOKEN_PATTERN = re.compile(r'[0-9A-Za-z_]+|\s+|.', re.DOTALL)
+
+
+# least recently used results of inline_diff() bounded by both the number of
+# line pairs and their total length so long lines can not hold on to large
+# amounts of memory
+class _InlineDiffCache:
+    def __init__(self) -> None:
+        self._results: OrderedDict[Tuple[str, str], Tuple[DiffEngineInterface.Match, ...]] = \
+            OrderedDict()
+        self._chars = 0
+
+    def get(self, a: str, b: str) -> Tuple[DiffEngineInterface.Match, ...]:
+        key = (a, b)
+        results = self._results
+        result = results.get(key)
+        if result is not None:
+            results.move_to_end(key)
+            return result
+        result = _inline_diff(a, b)
+        size = len(a) + len(b)
+        if size <= CACHE_CHARS:
+            results[key] = result
+            self._chars += size
+            while len(results) > CACHE_SIZE or self._chars > CACHE_CHARS:
+                (old_a, old_b), _ = results.popitem(last=False)
+                self._chars -= len(old_a) + len(old_b)
+        return result
+
+
+_cache = _InlineDiffCache()
+
+
+# returns the blocks of matching characters of 'a' and 'b' ordered by
+# position, terminated by a zero length block located at (len(a), len(b))
+#
+# Short lines are compared character by character.  The cost of comparing
+# long lines is bounded by comparing whole tokens instead.  Results are cached
+# as the same pairs of lines are compared each time they are repainted.
+def inline_diff(a: str, b: str) -> Tuple[DiffEngineInterface.Match, ...]:
+    return _cache.get(a, b)
+
+
+# compares 'a' and 'b' for inline_diff() without caching the result
+def _inline_diff(a: str, b: str) -> Tuple[DiffEngineInterface.Match, ...]:
+    len_a, len_b = len(a), len(b)
+    # trim the common prefix and suffix
+    prefix = _common_prefix_length(a, b)
+    suffix = _common_suffix_length(a, b, min(len_a, len_b) - prefix)
+    end_a, end_b = len_a - suffix, len_b - suffix
+
+    matches: DiffEngineInterface.MatchList = []
+    if prefix:
+        matches.append((0, 0, prefix))
+    if prefix < end_a and prefix < end_b:
+        aa, bb = a[prefix:end_a], b[prefix:end_b]
+        blocks: Sequence[DiffEngineInterface.Match]
+        if len(aa) + len(bb) <= CHAR_DIFF_THRESHOLD:
+            blocks = difflib.SequenceMatcher(None, aa, bb).get_matching_blocks()
+        else:
+            blocks = _token_diff(aa, bb)
+        for idx_a, idx_b, n in blocks:
+            if n:
+                matches.append((idx_a + prefix, idx_b + prefix, n))
+    if suffix:
+        matches.append((end_a, end_b, suffix))
+    # add a zero length block to the end
+    matches.append((len_a, len_b, 0))
+    return tuple(matches)
+
+
+# returns the matching blocks of characters found by comparing the tokens of
+# 'a' and 'b'
+#
+# Sections between the matching tokens are compared character by character
+# until MAX_CHAR_DIFF_COST is used up, sections that do not fit in what is
+# left are kept as coarse differences.
+def _token_diff(a: str, b: str) -> DiffEngineInterface.MatchList:
+    tokens_a, starts_a = _tokenise(a)
+    tokens_b, starts_b = _tokenise(b)
+    blocks: Sequence[DiffEngineInterface.Match]
+    if len(tokens_a) * len(tokens_b) <= MAX_TOKEN_DIFF_COST:
+        blocks = difflib.SequenceMatcher(None, tokens_a, tokens_b).get_matching_blocks()
+    else:
+        # map the tokens to integers so they can be compared cheaply
+        ids: Dict[str, int] = {}
+        blocks = anchor_diff(
+            [ids.setdefault(s, len(ids)) for s in tokens_a],
+            [ids.setdefault(s, len(ids)) for s in tokens_b])
+    # convert token indices into character indices
+    matches: DiffEngineInterface.MatchList = []
+    end_a, end_b = 0, 0
+    budget = MAX_CHAR_DIFF_COST
+    for idx_a, idx_b, n in blocks:
+        start_a, start_b = starts_a[idx_a], starts_b[idx_b]
+        cost = (start_a - end_a) * (start_b - end_b)
+        if 0 < cost <= budget and start_a - end_a + start_b - end_b <= CHAR_DIFF_THRESHOLD:
+            # refine the differences between the matching tokens
+            budget -= cost
+            for i, j, m in difflib.SequenceMatcher(
+                    None, a[end_a:start_a], b[end_b:start_b]).get_matching_blocks():
+                if m:
+                    matches.append((i + end_a, j + end_b, m))
+        if n:
+            end_a, end_b = starts_a[idx_a + n], starts_b[idx_b + n]
+            matches.append((start_a, start_b, end_a - start_a))
+    return matches
+
+
+# split 's' into tokens and returns them along with their start indices, the
+# indices include an extra entry for the end of the string
+def _tokenise(s: str) -> Tuple[List[str], List[int]]:
+    tokens: List[str] = []
+    starts: List[int] = []
+    for m in _TOKEN_PATTERN.finditer(s):
+        tokens.append(m.group())
+        starts.append(m.start())
+    starts.append(len(s))
+    return tokens, starts
+
+
+# returns the length of the longest common prefix of 'a' and 'b'
+def _common_prefix_length(a: str, b: str) -> int:
+    # binary search comparing slices so the work is done in C
+    lo, hi = 0, min(len(a), len(b))
+    if a[:hi] == b[:hi]:
+        return hi
+    # invariant: a[:lo] == b[:lo] and a[:hi] != b[:hi]
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+# returns the length of the longest common suffix of 'a' and 'b' that is no
+# longer than 'limit'
+def _common_suffix_length(a: str, b: str, limit: int) -> int:
+    len_a, len_b = len(a), len(b)
+    lo, hi = 0, limit
+    if a[len_a - hi:] == b[len_b - hi:]:
+        return hi
+    # invariant: the last 'lo' characters match and the last 'hi' do not
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if a[len_a - mid:len_a - lo] == b[len_b - mid:len_b - lo]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
@@ -0,0 +1,167 @@
+# Diffuse: a graphical tool for merging and comparing text files.
+#
+# Copyright (C) 2019 Derrick Moser <derrick_moser@yahoo.com>
+# Copyright (C) 2021 Romain Failliot <romain.failliot@foolstep.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+from typing import List, Optional, Sequence, Tuple
+
+from diffuse.diffengines.engine_interface import DiffBudget, DiffEngineInterface
+
+
+# Myers' O(ND) difference algorithm using the linear space refinement
+class Myers(DiffEngineInterface):
+    def diff(
+            self,
+            a: Sequence[int],
+            b: Sequence[int],
+            budget: DiffBudget) -> DiffEngineInterface.MatchList:
+        matches: DiffEngineInterface.MatchList = []
+        _myers_matches(a, 0, len(a), b, 0, len(b), matches, budget)
+        return _finish_matches(matches, len(a), len(b))
+
+
+# appends the matching blocks of a[start_a:end_a] and b[start_b:end_b] to
+# 'matches' in no particular order
+def _myers_matches(
+        a: Sequence[int],
+        start_a: int,
+        end_a: int,
+        b: Sequence[int],
+        start_b: int,
+        end_b: int,
+        matches: DiffEngineInterface.MatchList,
+        budget: DiffBudget) -> None:
+    blocks = [(start_a, end_a, start_b, end_b)]
+    while blocks:
+        budget.check()
+        start_a, end_a, start_b, end_b = blocks.pop()
+        # common prefix
+        idx_a, idx_b = start_a, start_b
+        while idx_a < end_a and idx_b < end_b and a[idx_a] == b[idx_b]:
+            idx_a += 1
+            idx_b += 1
+        if idx_a > start_a:
+            matches.append((start_a, start_b, idx_a - start_a))
+            start_a, start_b = idx_a, idx_b
+        # common suffix
+        idx_a, idx_b = end_a, end_b
+        while start_a < idx_a and start_b < idx_b and a[idx_a - 1] == b[idx_b - 1]:
+            idx_a -= 1
+            idx_b -= 1
+        if idx_a < end_a:
+            matches.append((idx_a, idx_b, end_a - idx_a))
+            end_a, end_b = idx_a, idx_b
+        if start_a < end_a and start_b < end_b:
+            # split the remaining section at the middle snake and process
+            # both halves
+            split = _middle_snake(a, start_a, end_a, b, start_b, end_b, budget)
+            if split is not None:
+                x, y = split
+                blocks.append((x, end_a, y, end_b))
+                blocks.append((start_a, x, start_b, y))
+
+
+# finds where the forward and reverse searches for the shortest edit script
+# of a[start_a:end_a] and b[start_b:end_b] overlap
+#
+# The sections must not have a common prefix or suffix.  The returned point
+# splits the problem into two smaller ones.  None is returned if there are no
+# common elements.
+def _middle_snake(
+        a: Sequence[int],
+        start_a: int,
+        end_a: int,
+        b: Sequence[int],
+        start_b: int,
+        end_b: int,
+        budget: DiffBudget) -> Optional[Tuple[int, int]]:
+    len_a, len_b = end_a - start_a, end_b - start_b
+    max_d = (len_a + len_b + 1) // 2
+    offset = max_d
+    # furthest reaching x for each diagonal of the forward and reverse paths
+    # the reverse path measures x from the end of the section
+    vf = [-1] * (2 * max_d + 2)
+    vf[offset + 1] = 0
+    vr = vf[:]
+    delta = len_a - len_b
+    odd = delta & 1
+    # diagonals that have run off the edge of the section are skipped
+    kf_start, kf_end, kr_start, kr_end = 0, 0, 0, 0
+    for d in range(max_d):
+        budget.check()
+        # advance the forward path
+        for k in range(-d + kf_start, d + 1 - kf_end, 2):
+            i = offset + k
+            if k == -d or (k != d and vf[i - 1] < vf[i + 1]):
+                x = vf[i + 1]
+            else:
+                x = vf[i - 1] + 1
+            y = x - k
+            while x < len_a and y < len_b and a[start_a + x] == b[start_b + y]:
+                x += 1
+                y += 1
+            vf[i] = x
+            if x > len_a:
+                kf_end += 2
+            elif y > len_b:
+                kf_start += 2
+            elif odd:
+                j = offset + delta - k
+                if 0 <= j < len(vr) and vr[j] != -1 and x >= len_a - vr[j]:
+                    return start_a + x, start_b + y
+        # advance the reverse path
+        for k in range(-d + kr_start, d + 1 - kr_end, 2):
+            i = offset + k
+            if k == -d or (k != d and vr[i - 1] < vr[i + 1]):
+                x = vr[i + 1]
+            else:
+                x = vr[i - 1] + 1
+            y = x - k
+            while x < len_a and y < len_b and a[end_a - x - 1] == b[end_b - y - 1]:
+                x += 1
+                y += 1
+            vr[i] = x
+            if x > len_a:
+                kr_end += 2
+            elif y > len_b:
+                kr_start += 2
+            elif not odd:
+                j = offset + delta - k
+                if 0 <= j < len(vf) and vf[j] != -1:
+                    xf = vf[j]
+                    if xf >= len_a - x:
+                        return start_a + xf, start_b + xf - (delta - k)
+    return None
+
+
+# sorts and merges adjacent matching blocks and adds the terminating zero
+# length block
+def _finish_matches(
+        matches: DiffEngineInterface.MatchList,
+        len_a: int,
+        len_b: int) -> DiffEngineInterface.MatchList:
+    matches.sort()
+    result: List[DiffEngineInterface.Match] = []
+    for idx_a, idx_b, n in matches:
+        if result:
+            prev_a, prev_b, prev_n = result[-1]
+            if prev_a + prev_n == idx_a and prev_b + prev_n == idx_b:
+                result[-1] = (prev_a, prev_b, prev_n + n)
+                continue
+        result.append((idx_a, idx_b, n))
+    result.append((len_a, len_b, 0))
+    return result
@@ -0,0 +1,129 @@
+# Diffuse: a graphical tool for merging and comparing text files.
+#
+# Copyright (C) 2019 Derrick Moser <derrick_moser@yahoo.com>
+# Copyright (C) 2021 Romain Failliot <romain.failliot@foolstep.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import re
+
+from collections import OrderedDict
+from typing import Dict, Final, Optional, Tuple
+
+from diffuse import utils
+
+import gi  # type: ignore
+gi.require_version('Gtk', '3.0')
+gi.require_version('Pango', '1.0')
+from gi.repository import Gtk, Pango  # type: ignore # noqa: E402
+
+# characters that may be measured arithmetically when the font has a fixed
+# pitch: printable ASCII and the symbols used to show white space
+FIXED_WIDTH_CHARACTERS: Final = ''.join(chr(c) for c in range(32, 127)) + '\u00b6\u00b7\u00bb'
+_FIXED_WIDTH_TEXT: Final = re.compile(f'[{re.escape(FIXED_WIDTH_CHARACTERS)}]*')
+
+
+# returns true if 'text' only contains characters from FIXED_WIDTH_CHARACTERS
+def is_fixed_width_text(text: str) -> bool:
+    return _FIXED_WIDTH_TEXT.fullmatch(text) is not None
+
+
+# Size-bounded cache of Pango layouts and their widths shared by all of the
+# text panes.  The least recently used layouts are evicted first.
+#
+# Layouts are keyed by their text and font.  Tabs are expanded before text is
+# given to Pango so the tab settings are already part of the text.  Cached
+# layouts must not be modified by callers.
+class LayoutCache:
+    def __init__(self, size: int = 8192) -> None:
+        self.size = size
+        self._layouts: OrderedDict[Tuple[str, str], Tuple[Pango.Layout, int]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # character width of fixed pitch fonts keyed by font description
+        self._char_widths: Dict[str, Optional[int]] = {}
+
+    # returns a layout for 'text' using 'font' and its width in Pango units
+    def get(
+            self,
+            widget: Gtk.Widget,
+            font: Pango.FontDescription,
+            text: str) -> Tuple[Pango.Layout, int]:
+        key = (text, font.to_string())
+        layouts = self._layouts
+        item = layouts.get(key)
+        if item is not None:
+            self.hits += 1
+            layouts.move_to_end(key)
+            return item
+        self.misses += 1
+        layout = widget.create_pango_layout(text)
+        layout.set_font_description(font)
+        item = (layout, layout.get_size()[0])
+        layouts[key] = item
+        if len(layouts) > self.size:
+            layouts.popitem(last=False)
+        if self.misses % self.size == 0:
+            self.logStatistics()
+        return item
+
+    # returns a layout for 'text' using 'font'
+    def getLayout(self, widget: Gtk.Widget, font: Pango.FontDescription, text: str) -> Pango.Layout:
+        return self.get(widget, font, text)[0]
+
+    # returns the width of 'text' using 'font' in Pango units
+    def getWidth(self, widget: Gtk.Widget, font: Pango.FontDescription, text: str) -> int:
+        if len(text) == 0:
+            return 0
+        return self.get(widget, font, text)[1]
+
+    # returns the width in Pango units shared by every character of
+    # FIXED_WIDTH_CHARACTERS when using 'font', or None if their widths differ
+    def getFixedCharWidth(self, widget: Gtk.Widget, font: Pango.FontDescription) -> Optional[int]:
+        key = font.to_string()
+        if key in self._char_widths:
+            return self._char_widths[key]
+
+        def measure(text):
+            layout = widget.create_pango_layout(text)
+            layout.set_font_description(font)
+            return layout.get_size()[0]
+
+        w: Optional[int] = measure('M')
+        if not w or any(measure(c) != w for c in FIXED_WIDTH_CHARACTERS):
+            w = None
+        else:
+            # check kerning and rounding do not affect longer strings
+            s = 8 * FIXED_WIDTH_CHARACTERS
+            if measure(s) != w * len(s):
+                w = None
+        utils.logDebug(f'Fixed character width for "{key}": {w}')
+        self._char_widths[key] = w
+        return w
+
+    # discard all cached layouts and measurements
+    def clear(self) -> None:
+        self.logStatistics()
+        self._layouts.clear()
+        self._char_widths.clear()
+
+    # report the cache's efficiency to help tune its size
+    def logStatistics(self) -> None:
+        utils.logDebug(
+            f'Layout cache: {self.hits} hits, {self.misses} misses, '
+            f'{len(self._layouts)}/{self.size} layouts')
+
+
+theLayoutCache: Final = LayoutCache()
@@ -25,6 +25,7 @@ from gettext import gettext as _
 from typing import Optional
 
 from diffuse import constants, utils
+from diffuse.diffengines.engine_registry import theDiffEngines
 from diffuse.resources import theResources
 from diffuse.window import DiffuseWindow
 
@@ -189,6 +190,14 @@ class DiffuseApplication(Gtk.Application):
             GLib.OptionArg.NONE,
             _('Ignore white space differences'),
         )
+        self.add_main_option(
+            'diff-algorithm',
+            0,
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.STRING,
+            _('Use <algorithm> to align lines (histogram, myers or patience)'),
+            'algorithm',
+        )
         self.set_option_context_summary(_(
             '''Diffuse is a graphical tool for merging and comparing text files. Diffuse is
 able to compare an arbitrary number of files side-by-side and gives users the
@@ -240,14 +249,29 @@ also retrieve revisions of files from several VCSs for comparison and merging.''
                     rc_files.append(rc_file)
         if 'rcfile' in options:
             rc_files.append(options['rcfile'])
-        for rc_file in rc_files:
-            # convert to absolute path so the location of any processing errors are
-            # reported with normalized file names
-            rc_file = os.path.abspath(rc_file)
-            try:
-                theResources.parse(rc_file)
-            except IOError:
-                utils.logError(_('Error reading %s.') % (rc_file,))
+        # convert to absolute paths so the location of any processing errors are
+        # reported with normalized file names
+        rc_files = [os.path.abspath(rc_file) for rc_file in rc_files]
+        # the parsed resources are cached unless resource files are disabled
+        cache_file = None
+        if 'no-rcfile' not in options:
+            # find the local cache directory and create it if it didn't exist
+            cache_dir = os.environ.get('XDG_CACHE_HOME', None)
+            subdirs = ['diffuse']
+            if cache_dir is None:
+                cache_dir = os.path.expanduser('~')
+                subdirs.insert(0, '.cache')
+            cache_dir = utils.make_subdirs(cache_dir, subdirs)
+            cache_file = os.path.join(cache_dir, 'resources.cache')
+        if cache_file is None or not theResources.loadCache(cache_file, rc_files):
+            for rc_file in rc_files:
+                try:
+                    theResources.parse(rc_file)
+                except IOError:
+                    utils.logError(_('Error reading %s.') % (rc_file,))
+                    theResources.has_errors = True
+            if cache_file is not None:
+                theResources.saveCache(cache_file, rc_files)
 
         diff_window = DiffuseWindow(rc_dir, application=self)
         self.window = diff_window
@@ -322,6 +346,12 @@ also retrieve revisions of files from several VCSs for comparison and merging.''
             diff_window.prefs.setBool('display_ignore_whitespace', True)
             diff_window.prefs.setBool('align_ignore_whitespace', True)
             diff_window.preferences_updated()
+        if 'diff-algorithm' in options:
+            if options['diff-algorithm'] in theDiffEngines.getNames():
+                diff_window.prefs.setString('align_algorithm', options['diff-algorithm'])
+                diff_window.preferences_updated()
+            else:
+                utils.logError(_('Unknown diff algorithm "%s".') % (options['diff-algorithm'],))
         if 'label' in options:
             labels.append(options['label'])
         if 'line' in options:
@@ -0,0 +1,135 @@
+# Diffuse: a graphical tool for merging and comparing text files.
+#
+# Copyright (C) 2019 Derrick Moser <derrick_moser@yahoo.com>
+# Copyright (C) 2021 Romain Failliot <romain.failliot@foolstep.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import re
+
+from typing import Final, Iterator, List, Optional, Tuple
+
+from diffuse import utils
+
+# translation table removing all white space characters
+_DELETE_WHITESPACE: Final = str.maketrans('', '', utils.whitespace)
+# a span of white space characters
+_WHITESPACE_SPAN: Final = re.compile(f'[{re.escape(utils.whitespace)}]+')
+# a span of white space characters or a single other character
+_WHITESPACE_SPAN_OR_CHAR: Final = re.compile(
+    f'[{re.escape(utils.whitespace)}]+|[^{re.escape(utils.whitespace)}]')
+# a single character that is not white space
+_NON_WHITESPACE_CHAR: Final = re.compile(f'[^{re.escape(utils.whitespace)}]')
+
+
+# returns true if the string only contains whitespace characters
+def is_blank(s: str) -> bool:
+    return not s.strip(utils.whitespace)
+
+
+# Callable object that normalises a line of text according to a set of
+# comparison preferences.  Instances are meant to be created once each time
+# the preferences change and then shared by all code comparing lines.
+#
+# Calling the normaliser returns the normalised text or 'blank' if the line
+# only contains white space and blank lines should be ignored.
+class TextNormalizer:
+    def __init__(
+            self,
+            ignore_endofline: bool,
+            ignore_blanklines: bool,
+            ignore_whitespace: bool,
+            ignore_whitespace_changes: bool,
+            ignore_case: bool,
+            blank: Optional[str] = None) -> None:
+        self.ignore_endofline = ignore_endofline
+        self.ignore_blanklines = ignore_blanklines
+        self.ignore_whitespace = ignore_whitespace
+        self.ignore_whitespace_changes = ignore_whitespace_changes and not ignore_whitespace
+        self.ignore_case = ignore_case
+        self.blank = blank
+        # normalisers with equal signatures produce identical results
+        self.signature = (
+            ignore_endofline,
+            ignore_blanklines,
+            ignore_whitespace,
+            self.ignore_whitespace_changes,
+            ignore_case,
+            blank)
+
+    def __call__(self, s: str) -> Optional[str]:
+        if self.ignore_endofline:
+            s = utils.strip_eol(s)
+        if self.ignore_blanklines and not s.strip(utils.whitespace):
+            return self.blank
+        if self.ignore_whitespace:
+            # strip all white space characters
+            if s.isascii():
+                # bytes.split() separates on exactly the same white space
+                # characters and is much faster than a translation
+                s = b''.join(s.encode('ascii').split()).decode('ascii')
+            else:
+                s = s.translate(_DELETE_WHITESPACE)
+        elif self.ignore_whitespace_changes:
+            # map all spans of white space characters to a single space
+            if s.isascii():
+                b = s.encode('ascii')
+                words = b.split()
+                if words:
+                    r = b' '.join(words)
+                    if b[:1].isspace():
+                        r = b' ' + r
+                    if b[-1:].isspace():
+                        r += b' '
+                    s = r.decode('ascii')
+                elif s:
+                    s = ' '
+            else:
+                s = _WHITESPACE_SPAN.sub(' ', s)
+        if self.ignore_case:
+            # force everything to be upper case
+            s = s.upper()
+        return s
+
+    # returns a mapping from character indices in the normalised string to
+    # those in 's', the mapping contains one extra entry for the end of the
+    # string
+    #
+    # None is returned if the normalised string always has the same length as
+    # 's' (ignoring line endings)
+    def getOffsets(self, s: str) -> Optional[List[int]]:
+        if self.ignore_whitespace:
+            regex = _NON_WHITESPACE_CHAR
+        elif self.ignore_whitespace_changes:
+            regex = _WHITESPACE_SPAN_OR_CHAR
+        else:
+            return None
+        if self.ignore_endofline:
+            s = utils.strip_eol(s)
+        # only the first character of each match is kept by the normaliser
+        lookup = [m.start() for m in regex.finditer(s)]
+        lookup.append(len(s))
+        return lookup
+
+    # returns the ranges of 's' between 'start' and 'end' that do not contain
+    # any white space characters
+    @staticmethod
+    def getNonWhitespaceRanges(s: str, start: int, end: int) -> Iterator[Tuple[int, int]]:
+        for m in _WHITESPACE_SPAN.finditer(s, start, end):
+            if start != m.start():
+                yield start, m.start()
+            start = m.end()
+        if start != end:
+            yield start, end
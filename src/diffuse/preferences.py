@@ -70,6 +70,7 @@ class Preferences:
         #    [ 'String', name, default, label ]
         #    [ 'File', name, default, label ]
         #    [ 'Font', name, default, label ]
+        #    [ 'Choice', name, default, label, [ (value, label), ... ] ]
         self.template = [
             'FolderSet',
             _('Display'),
@@ -90,6 +91,13 @@ class Preferences:
             _('Alignment'),
             [
                 'List',
+                ['Choice', 'align_algorithm', 'patience', _('Algorithm'), [
+                    ('patience', _('Patience')),
+                    ('histogram', _('Histogram')),
+                    ('myers', _('Myers'))
+                ]],
+                ['Integer', 'align_time_limit', 5000, _('Time limit in milliseconds (0 for none)'), 0, 3600000],  # noqa: E501
+                ['Boolean', 'align_after_edits', False, _('Realign lines around edits')],
                 ['Boolean', 'align_ignore_case', False, _('Ignore case')],
                 ['Boolean', 'align_ignore_whitespace', True, _('Ignore white space')],
                 ['Boolean', 'align_ignore_whitespace_changes', False, _('Ignore changes to white space')],  # noqa: E501
@@ -236,7 +244,7 @@ class Preferences:
             self.setInt(template[1], template[2])
             self.int_prefs_min[template[1]] = template[4]
             self.int_prefs_max[template[1]] = template[5]
-        elif template[0] in ['String', 'File', 'Font', 'Encoding']:
+        elif template[0] in ['String', 'File', 'Font', 'Encoding', 'Choice']:
             self.setString(template[1], template[2])
 
     # callback used when a preference is toggled
@@ -361,10 +369,17 @@ class Preferences:
                         entry.set_text(tpl[3])
                     elif tpl_section == 'File':
                         entry = _FileEntry(parent, tpl[3])
+                    elif tpl_section == 'Choice':
+                        entry = Gtk.ComboBoxText()
+                        for value, choice_label in tpl[4]:
+                            entry.append(value, choice_label)
                     else:
                         entry = Gtk.Entry()
                     widgets[tpl[1]] = entry
-                    entry.set_text(self.getString(tpl[1]))
+                    if tpl_section == 'Choice':
+                        entry.set_active_id(self.getString(tpl[1]))
+                    else:
+                        entry.set_text(self.getString(tpl[1]))
                 table.attach(entry, 1, i, 1, 1)
                 entry.show()
             table.show()
@@ -380,6 +395,8 @@ class Preferences:
             text = widget.get_text()
         elif isinstance(widget, Gtk.FontButton):
             text = widget.get_font()
+        elif isinstance(widget, Gtk.ComboBoxText):
+            text = widget.get_active_id()
         else:
             raise TypeError(f"Don't know how to get text from type: {type(widget)}")
         return text
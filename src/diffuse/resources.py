@@ -26,14 +26,15 @@
 
 import glob
 import os
+import pickle
 import platform
 import re
 import shlex
 
 from gettext import gettext as _
-from typing import Dict, Final, List, Optional, Pattern, Set, Tuple
+from typing import Any, Dict, Final, List, Optional, Pattern, Set, Tuple
 
-from diffuse import utils
+from diffuse import constants, utils
 
 import gi  # type: ignore
 gi.require_version('Gdk', '3.0')
@@ -219,6 +220,10 @@ class Resources:
 
         # list of imported resources files (we only import each file once)
         self.resource_files: Set[str] = set()
+        # directories searched for resource files to import using wildcards
+        self.import_dirs: Set[str] = set()
+        # True if errors were found in the resource files
+        self.has_errors = False
 
         # special string resources
         self.setDifferenceColours('difference_1 difference_2 difference_3')
@@ -336,7 +341,21 @@ class Resources:
         return list(self.syntaxes.keys())
 
     def getSyntax(self, name):
-        return self.syntaxes.get(name, None)
+        syntax = self.syntaxes.get(name, None)
+        if syntax is not None and syntax.deferred_lines:
+            # add the patterns that were skipped when the resource files were
+            # read
+            lines, syntax.deferred_lines = syntax.deferred_lines, []
+            current_syntax, self.current_syntax = self.current_syntax, syntax
+            for file_name, i, s in lines:
+                self._parseLine(file_name, i, s)
+            self.current_syntax = current_syntax
+        if syntax is not None and syntax.deferred_patterns:
+            # compile the patterns restored by loadCache()
+            patterns, syntax.deferred_patterns = syntax.deferred_patterns, []
+            for prev_state, next_state, token_type, pattern, flags in patterns:
+                syntax.addPattern(prev_state, next_state, token_type, re.compile(pattern, flags))
+        return syntax
 
     def guessSyntaxForFile(self, name: str, ss: List[str]) -> Optional[str]:
         name = os.path.basename(name)
@@ -361,173 +380,348 @@ class Resources:
         with open(file_name, 'r', encoding='utf-8') as f:
             ss = utils.readconfiglines(f)
 
-        # FIXME: improve validation
         for i, s in enumerate(ss):
-            args = shlex.split(s, True)
-            if len(args) == 0:
-                continue
+            if self.current_syntax is not None and _SYNTAX_PATTERN_LINE.match(s):
+                # syntax patterns are only parsed and compiled the first time
+                # the syntax is used
+                self.current_syntax.deferred_lines.append((file_name, i, s))
+            else:
+                self._parseLine(file_name, i, s)
 
-            try:
-                # eg. add Python syntax highlighting:
-                #    import /usr/share/diffuse/syntax/python.syntax
-                if args[0] == 'import':
-                    if len(args) != 2:
-                        raise SyntaxError(_('Imports must have one argument'))
-                    path = os.path.expanduser(args[1])
-                    # relative paths are relative to the parsed file
-                    path = os.path.join(utils.globEscape(os.path.dirname(file_name)), path)
-                    paths = glob.glob(path)
-                    if len(paths) == 0:
-                        paths = [path]
-                    for path in paths:
-                        # convert to absolute path so the location of
-                        # any processing errors are reported with
-                        # normalized file names
-                        self.parse(os.path.abspath(path))
-                # eg. make Ctrl+o trigger the open_file menu item
-                #    keybinding menu open_file Ctrl+o
-                elif args[0] == 'keybinding':
-                    if len(args) != 4:
-                        raise SyntaxError(_('Key bindings must have three arguments'))
-                    self.setKeyBinding(args[1], args[2], args[3])
-                # eg. set the regular background colour to white
-                #    colour text_background 1.0 1.0 1.0
-                elif args[0] in ['colour', 'color']:
-                    if len(args) != 5:
-                        raise SyntaxError(_('Colors must have four arguments'))
-                    self.colours[args[1]] = _Colour(float(args[2]), float(args[3]), float(args[4]))
-                # eg. set opacity of the line_selection colour
-                #    float line_selection_opacity 0.4
-                elif args[0] == 'float':
-                    if len(args) != 3:
-                        raise SyntaxError(_('Floats must have two arguments'))
-                    self.floats[args[1]] = float(args[2])
-                # eg. enable option log_print_output
-                #    option log_print_output true
-                elif args[0] == 'option':
-                    if len(args) != 3:
-                        raise SyntaxError(_('Options must have two arguments'))
-                    if args[1] not in self.options:
-                        raise SyntaxError(
-                            _('Option "{option}" is unknown').format(option=args[1])
-                        )
-                    self.options[args[1]] = args[2]
-                # eg. set the help browser
-                #    string help_browser gnome-help
-                elif args[0] == 'string':
-                    if len(args) != 3:
-                        raise SyntaxError(_('Strings must have two arguments'))
-                    self.strings[args[1]] = args[2]
-                    if args[1] == 'difference_colours':
-                        self.setDifferenceColours(args[2])
-                # eg. start a syntax specification for Python
-                #    syntax Python normal text
-                # where 'normal' is the name of the default state and
-                # 'text' is the classification of all characters not
-                # explicitly matched by a syntax highlighting rule
-                elif args[0] == 'syntax':
-                    if len(args) != 3 and len(args) != 4:
-                        raise SyntaxError(_('Syntaxes must have two or three arguments'))
-                    key = args[1]
-                    if len(args) == 2:
-                        # remove file pattern for a syntax specification
-                        try:
-                            del self.syntax_file_patterns[key]
-                        except KeyError:
-                            pass
-                        # remove magic pattern for a syntax specification
-                        try:
-                            del self.syntax_magic_patterns[key]
-                        except KeyError:
-                            pass
-                        # remove a syntax specification
-                        self.current_syntax = None
-                        try:
-                            del self.syntaxes[key]
-                        except KeyError:
-                            pass
+    # parse line 'i' of resource file 'file_name'
+    def _parseLine(self, file_name: str, i: int, s: str) -> None:
+        # FIXME: improve validation
+        args = shlex.split(s, True)
+        if len(args) == 0:
+            return
+
+        try:
+            # eg. add Python syntax highlighting:
+            #    import /usr/share/diffuse/syntax/python.syntax
+            if args[0] == 'import':
+                if len(args) != 2:
+                    raise SyntaxError(_('Imports must have one argument'))
+                path = os.path.expanduser(args[1])
+                # relative paths are relative to the parsed file
+                path = os.path.join(utils.globEscape(os.path.dirname(file_name)), path)
+                paths = glob.glob(path)
+                if glob.has_magic(path):
+                    # files added to these directories change the result
+                    self.import_dirs.update(os.path.dirname(p) for p in paths)
+                if len(paths) == 0:
+                    paths = [path]
+                for path in paths:
+                    # convert to absolute path so the location of
+                    # any processing errors are reported with
+                    # normalized file names
+                    self.parse(os.path.abspath(path))
+            # eg. make Ctrl+o trigger the open_file menu item
+            #    keybinding menu open_file Ctrl+o
+            elif args[0] == 'keybinding':
+                if len(args) != 4:
+                    raise SyntaxError(_('Key bindings must have three arguments'))
+                self.setKeyBinding(args[1], args[2], args[3])
+            # eg. set the regular background colour to white
+            #    colour text_background 1.0 1.0 1.0
+            elif args[0] in ['colour', 'color']:
+                if len(args) != 5:
+                    raise SyntaxError(_('Colors must have four arguments'))
+                self.colours[args[1]] = _Colour(float(args[2]), float(args[3]), float(args[4]))
+            # eg. set opacity of the line_selection colour
+            #    float line_selection_opacity 0.4
+            elif args[0] == 'float':
+                if len(args) != 3:
+                    raise SyntaxError(_('Floats must have two arguments'))
+                self.floats[args[1]] = float(args[2])
+            # eg. enable option log_print_output
+            #    option log_print_output true
+            elif args[0] == 'option':
+                if len(args) != 3:
+                    raise SyntaxError(_('Options must have two arguments'))
+                if args[1] not in self.options:
+                    raise SyntaxError(
+                        _('Option "{option}" is unknown').format(option=args[1])
+                    )
+                self.options[args[1]] = args[2]
+            # eg. set the help browser
+            #    string help_browser gnome-help
+            elif args[0] == 'string':
+                if len(args) != 3:
+                    raise SyntaxError(_('Strings must have two arguments'))
+                self.strings[args[1]] = args[2]
+                if args[1] == 'difference_colours':
+                    self.setDifferenceColours(args[2])
+            # eg. start a syntax specification for Python
+            #    syntax Python normal text
+            # where 'normal' is the name of the default state and
+            # 'text' is the classification of all characters not
+            # explicitly matched by a syntax highlighting rule
+            elif args[0] == 'syntax':
+                if len(args) != 3 and len(args) != 4:
+                    raise SyntaxError(_('Syntaxes must have two or three arguments'))
+                key = args[1]
+                if len(args) == 2:
+                    # remove file pattern for a syntax specification
+                    try:
+                        del self.syntax_file_patterns[key]
+                    except KeyError:
+                        pass
+                    # remove magic pattern for a syntax specification
+                    try:
+                        del self.syntax_magic_patterns[key]
+                    except KeyError:
+                        pass
+                    # remove a syntax specification
+                    self.current_syntax = None
+                    try:
+                        del self.syntaxes[key]
+                    except KeyError:
+                        pass
+                else:
+                    self.current_syntax = _SyntaxParser(args[2], args[3])
+                    self.syntaxes[key] = self.current_syntax
+            # eg. transition from state 'normal' to 'comment' when
+            # the pattern '#' is matched and classify the matched
+            # characters as 'python_comment'
+            #    syntax_pattern normal comment python_comment '#'
+            elif args[0] == 'syntax_pattern' and self.current_syntax is not None:
+                if len(args) < 5:
+                    raise SyntaxError(_('Syntax patterns must have at least four arguments'))
+                flags = 0
+                for arg in args[5:]:
+                    if arg == 'ignorecase':
+                        flags |= re.IGNORECASE
                     else:
-                        self.current_syntax = _SyntaxParser(args[2], args[3])
-                        self.syntaxes[key] = self.current_syntax
-                # eg. transition from state 'normal' to 'comment' when
-                # the pattern '#' is matched and classify the matched
-                # characters as 'python_comment'
-                #    syntax_pattern normal comment python_comment '#'
-                elif args[0] == 'syntax_pattern' and self.current_syntax is not None:
-                    if len(args) < 5:
-                        raise SyntaxError(_('Syntax patterns must have at least four arguments'))
+                        raise SyntaxError(_('Value "{value}" is unknown').format(value=arg))
+                self.current_syntax.addPattern(
+                    args[1],
+                    args[2],
+                    args[3],
+                    re.compile(args[4], flags))
+            # eg. default to the Python syntax rules when viewing
+            # a file ending with '.py' or '.pyw'
+            #    syntax_files Python '\.pyw?$'
+            elif args[0] == 'syntax_files':
+                if len(args) != 2 and len(args) != 3:
+                    raise SyntaxError(_('Syntax files must have one or two arguments'))
+                key = args[1]
+                if len(args) == 2:
+                    # remove file pattern for a syntax specification
+                    try:
+                        del self.syntax_file_patterns[key]
+                    except KeyError:
+                        pass
+                else:
                     flags = 0
-                    for arg in args[5:]:
+                    if utils.isWindows():
+                        flags |= re.IGNORECASE
+                    self.syntax_file_patterns[key] = re.compile(args[2], flags)
+            # eg. default to the Python syntax rules when viewing
+            # a files starting with patterns like #!/usr/bin/python
+            #    syntax_magic Python '^#!/usr/bin/python$'
+            elif args[0] == 'syntax_magic':
+                if len(args) < 2:
+                    raise SyntaxError(_('Syntax magics must have at least one argument'))
+                key = args[1]
+                if len(args) == 2:
+                    # remove magic pattern for a syntax specification
+                    try:
+                        del self.syntax_magic_patterns[key]
+                    except KeyError:
+                        pass
+                else:
+                    flags = 0
+                    for arg in args[3:]:
                         if arg == 'ignorecase':
                             flags |= re.IGNORECASE
                         else:
-                            raise SyntaxError(_('Value "{value}" is unknown').format(value=arg))
-                    self.current_syntax.addPattern(
-                        args[1],
-                        args[2],
-                        args[3],
-                        re.compile(args[4], flags))
-                # eg. default to the Python syntax rules when viewing
-                # a file ending with '.py' or '.pyw'
-                #    syntax_files Python '\.pyw?$'
-                elif args[0] == 'syntax_files':
-                    if len(args) != 2 and len(args) != 3:
-                        raise SyntaxError(_('Syntax files must have one or two arguments'))
-                    key = args[1]
-                    if len(args) == 2:
-                        # remove file pattern for a syntax specification
-                        try:
-                            del self.syntax_file_patterns[key]
-                        except KeyError:
-                            pass
-                    else:
-                        flags = 0
-                        if utils.isWindows():
-                            flags |= re.IGNORECASE
-                        self.syntax_file_patterns[key] = re.compile(args[2], flags)
-                # eg. default to the Python syntax rules when viewing
-                # a files starting with patterns like #!/usr/bin/python
-                #    syntax_magic Python '^#!/usr/bin/python$'
-                elif args[0] == 'syntax_magic':
-                    if len(args) < 2:
-                        raise SyntaxError(_('Syntax magics must have at least one argument'))
-                    key = args[1]
-                    if len(args) == 2:
-                        # remove magic pattern for a syntax specification
-                        try:
-                            del self.syntax_magic_patterns[key]
-                        except KeyError:
-                            pass
-                    else:
-                        flags = 0
-                        for arg in args[3:]:
-                            if arg == 'ignorecase':
-                                flags |= re.IGNORECASE
-                            else:
-                                raise SyntaxError(
-                                    _('Value "{value}" is unknown').format(value=arg)
-                                )
-                        self.syntax_magic_patterns[key] = re.compile(args[2], flags)
-                else:
-                    raise SyntaxError(_('Keyword "{keyword}" is unknown').format(keyword=args[0]))
-            except SyntaxError as e:
-                error_msg = _('Syntax error at line {line} of {file}').format(
-                    line=i + 1,
-                    file=file_name
-                )
-                utils.logError(f'{error_msg}: {e.msg}')
-            except ValueError:
-                error_msg = _('Value error at line {line} of {file}').format(
-                    line=i + 1,
-                    file=file_name
-                )
-                utils.logError(error_msg)
-            except re.error:
-                error_msg = _('Regex error at line {line} of {file}.')
-                utils.logError(error_msg.format(line=i + 1, file=file_name))
-            except:  # noqa: E722
-                error_msg = _('Unhandled error at line {line} of {file}.')
-                utils.logError(error_msg.format(line=i + 1, file=file_name))
+                            raise SyntaxError(
+                                _('Value "{value}" is unknown').format(value=arg)
+                            )
+                    self.syntax_magic_patterns[key] = re.compile(args[2], flags)
+            else:
+                raise SyntaxError(_('Keyword "{keyword}" is unknown').format(keyword=args[0]))
+        except SyntaxError as e:
+            error_msg = _('Syntax error at line {line} of {file}').format(
+                line=i + 1,
+                file=file_name
+            )
+            utils.logError(f'{error_msg}: {e.msg}')
+            self.has_errors = True
+        except ValueError:
+            error_msg = _('Value error at line {line} of {file}').format(
+                line=i + 1,
+                file=file_name
+            )
+            utils.logError(error_msg)
+            self.has_errors = True
+        except re.error:
+            error_msg = _('Regex error at line {line} of {file}.')
+            utils.logError(error_msg.format(line=i + 1, file=file_name))
+            self.has_errors = True
+        except:  # noqa: E722
+            error_msg = _('Unhandled error at line {line} of {file}.')
+            utils.logError(error_msg.format(line=i + 1, file=file_name))
+            self.has_errors = True
+
+    # restore the state saved by saveCache() if it was saved after parsing
+    # 'file_names' and none of the files read since then have changed,
+    # returns True if the state was restored
+    def loadCache(self, cache_file: str, file_names: List[str]) -> bool:
+        try:
+            with open(cache_file, 'rb') as f:
+                key, paths, stats, state = _CacheUnpickler(f).load()
+        except Exception:
+            # missing, unreadable or incompatible cache
+            return False
+        if key != _getCacheKey(file_names) or _statFiles(paths) != stats:
+            return False
+        try:
+            self._setCacheState(state)
+        except Exception:
+            # incompatible cache, the files will be parsed again
+            utils.logDebug(f'Could not read the resource cache {cache_file}')
+            return False
+        return True
+
+    # save the state after parsing 'file_names' so it can be restored by
+    # loadCache() the next time the same files are parsed
+    def saveCache(self, cache_file: str, file_names: List[str]) -> None:
+        if not self.has_errors:
+            # errors in the syntax patterns are only found when they are
+            # parsed
+            for name in self.getSyntaxNames():
+                self.getSyntax(name)
+        if self.has_errors:
+            # report the errors again next time
+            return
+        # the directories are included so files added to imported globs are
+        # noticed, this module is included so changes to the parser are
+        paths = sorted(
+            self.resource_files | self.import_dirs | {os.path.abspath(__file__)})
+        # write to a temporary file first so a partially written cache is
+        # never read
+        temp_file = f'{cache_file}.{os.getpid()}'
+        try:
+            data = pickle.dumps(
+                (_getCacheKey(file_names), paths, _statFiles(paths), self._getCacheState()),
+                pickle.HIGHEST_PROTOCOL)
+            with open(temp_file, 'wb') as f:
+                f.write(data)
+            os.replace(temp_file, cache_file)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError):
+            utils.logDebug(f'Could not write the resource cache {cache_file}')
+            try:
+                os.remove(temp_file)
+            except OSError:
+                pass
+
+    # returns the parsed state as built-in types for saveCache(), patterns
+    # are described by their source and flags
+    def _getCacheState(self) -> Dict[str, Any]:
+        return {
+            'keybindings': [
+                (ctx, name, key, int(modifiers))
+                for (ctx, name), bindings in self.keybindings.items()
+                for _, (key, modifiers) in bindings.keys()
+            ],
+            'colours': {
+                symbol: (c.red, c.green, c.blue, c.alpha)
+                for symbol, c in self.colours.items()
+            },
+            'floats': self.floats,
+            'options': self.options,
+            'strings': self.strings,
+            'difference_colours': self.difference_colours,
+            'syntaxes': {
+                key: (syntax.initial_state, syntax.default_token_type, [
+                    (prev_state, next_state, token_type, pattern.pattern, pattern.flags)
+                    for prev_state, transitions in syntax.transitions_lookup.items()
+                    for pattern, token_type, next_state in transitions
+                ])
+                for key, syntax in self.syntaxes.items()
+            },
+            'syntax_files': _getPatternSources(self.syntax_file_patterns),
+            'syntax_magic': _getPatternSources(self.syntax_magic_patterns),
+            'resource_files': sorted(self.resource_files),
+            'import_dirs': sorted(self.import_dirs),
+        }
+
+    # restores the state returned by _getCacheState(), the syntax patterns
+    # are compiled the first time the syntax is used
+    #
+    # Nothing is changed if an exception is raised.
+    def _setCacheState(self, state: Dict[str, Any]) -> None:
+        keybindings: Dict[Tuple[str, str], Dict[Tuple[str, Tuple[int, Any]], None]] = {}
+        keybindings_lookup = {}
+        for ctx, name, key, modifiers in state['keybindings']:
+            key_tuple = (ctx, (key, Gdk.ModifierType(modifiers)))
+            keybindings.setdefault((ctx, name), {})[key_tuple] = None
+            keybindings_lookup[key_tuple] = (ctx, name)
+        colours = {symbol: _Colour(*rgba) for symbol, rgba in state['colours'].items()}
+        syntaxes = {}
+        for key, (initial_state, default_token_type, patterns) in state['syntaxes'].items():
+            syntax = _SyntaxParser(initial_state, default_token_type)
+            syntax.deferred_patterns = patterns
+            syntaxes[key] = syntax
+        syntax_file_patterns = _compilePatterns(state['syntax_files'])
+        syntax_magic_patterns = _compilePatterns(state['syntax_magic'])
+        floats, options, strings = state['floats'], state['options'], state['strings']
+        difference_colours = state['difference_colours']
+        resource_files, import_dirs = set(state['resource_files']), set(state['import_dirs'])
+
+        self.keybindings = keybindings
+        self.keybindings_lookup = keybindings_lookup
+        self.colours = colours
+        self.floats = floats
+        self.options = options
+        self.strings = strings
+        self.difference_colours = difference_colours
+        self.syntaxes = syntaxes
+        self.syntax_file_patterns = syntax_file_patterns
+        self.syntax_magic_patterns = syntax_magic_patterns
+        self.current_syntax = None
+        self.resource_files = resource_files
+        self.import_dirs = import_dirs
+
+
+# returns the key identifying state saved by Resources.saveCache() after
+# parsing 'file_names'
+def _getCacheKey(file_names: List[str]) -> Tuple[int, str, List[str]]:
+    return _CACHE_FORMAT, constants.VERSION, file_names
+
+
+# returns the (modification time, size) of each path, None is used for paths
+# that do not exist
+def _statFiles(paths: List[str]) -> List[Optional[Tuple[int, int]]]:
+    stats: List[Optional[Tuple[int, int]]] = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stats.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stats.append(None)
+    return stats
+
+
+# returns the (source, flags) of each pattern in 'patterns'
+def _getPatternSources(patterns: Dict[str, Pattern]) -> Dict[str, Tuple[str, int]]:
+    return {key: (pattern.pattern, pattern.flags) for key, pattern in patterns.items()}
+
+
+# compiles the patterns described by _getPatternSources()
+def _compilePatterns(sources: Dict[str, Tuple[str, int]]) -> Dict[str, Pattern]:
+    return {key: re.compile(pattern, flags) for key, (pattern, flags) in sources.items()}
+
+
+# reads the state written by Resources.saveCache()
+#
+# The state only contains built-in types, which are unpickled without looking
+# up any classes or functions, so refusing all lookups means the cache file
+# cannot run code.
+class _CacheUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f'{module}.{name} is not allowed in the resource cache')
 
 
 # colour resources
@@ -556,6 +750,17 @@ class _Colour:
         return self + other * (1 - self.alpha)
 
 
+# version of the state saved by Resources.saveCache(), increase it whenever
+# _getCacheState() changes
+_CACHE_FORMAT: Final = 1
+
+# a back reference in a regular expression
+_BACK_REFERENCE: Final = re.compile(r'\\[1-9]|\(\?P=')
+
+# a line of a resource file adding a syntax pattern
+_SYNTAX_PATTERN_LINE: Final = re.compile(r'\s*syntax_pattern\s')
+
+
 # class to build and run a finite state machine for identifying syntax tokens
 class _SyntaxParser:
     # create a new state machine that begins in initial_state and classifies
@@ -570,6 +775,19 @@ class _SyntaxParser:
         # tuples indicating the new state for the state machine when 'pattern'
         # is matched and how to classify the matched characters
         self.transitions_lookup: Dict[str, List[Tuple[Pattern, str, str]]] = {initial_state: []}
+        # (file_name, line_number, line) of the resource file lines adding
+        # patterns that have not been parsed yet
+        self.deferred_lines: List[Tuple[str, int, str]] = []
+        # (prev_state, next_state, token_type, pattern, flags) of the patterns
+        # restored from the resource cache that have not been compiled yet
+        self.deferred_patterns: List[Tuple[str, str, str, str, int]] = []
+        # mappings from a state to a single pattern combining all of its
+        # transition patterns and the (token_type, next_state) pair for the
+        # group identifying each of them, None is used for states whose
+        # patterns can not be combined
+        self.combined_lookup: Dict[
+            str,
+            Optional[Tuple[Pattern, Dict[int, Tuple[str, str]]]]] = {}
 
     # Adds a new edge to the finite state machine from prev_state to
     # next_state.  Characters will be identified as token_type when pattern is
@@ -586,19 +804,68 @@ class _SyntaxParser:
             if state not in self.transitions_lookup:
                 self.transitions_lookup[state] = []
         self.transitions_lookup[prev_state].append((pattern, token_type, next_state))
+        self.combined_lookup.pop(prev_state, None)
+
+    # returns a pattern matching the same text as the first of the patterns
+    # leaving 'state_name' that matches and the transition for each group
+    # identifying them, or None if the patterns can not be combined
+    def _getCombinedPattern(
+            self,
+            state_name: str) -> Optional[Tuple[Pattern, Dict[int, Tuple[str, str]]]]:
+        try:
+            return self.combined_lookup[state_name]
+        except KeyError:
+            pass
+        transitions = self.transitions_lookup[state_name]
+        combined = None
+        # group numbers change when patterns are combined so any back
+        # references would be broken
+        if not any(_BACK_REFERENCE.search(t[0].pattern) for t in transitions):
+            # alternatives are tried in order so the first pattern that matches
+            # wins, a state without patterns gets a pattern that never matches
+            parts = []
+            for i, transition in enumerate(transitions):
+                pattern = transition[0]
+                flags = 'i' if pattern.flags & re.IGNORECASE else ''
+                parts.append(f'(?P<_{i}>(?{flags}:{pattern.pattern}))')
+            try:
+                regex = re.compile('|'.join(parts) if parts else '(?!)')
+            except re.error:
+                pass
+            else:
+                combined = (regex, {
+                    regex.groupindex[f'_{i}']: transition[1:]
+                    for i, transition in enumerate(transitions)
+                })
+        self.combined_lookup[state_name] = combined
+        return combined
 
     # given a string and an initial state, identify the final state and tokens
     def parse(self, state_name, s):
-        transitions, blocks, start = self.transitions_lookup[state_name], [], 0
-        while start < len(s):
-            for pattern, token_type, next_state in transitions:
-                m = pattern.match(s, start)
-                if m is not None:
-                    end, state_name = m.span()[1], next_state
-                    transitions = self.transitions_lookup[state_name]
-                    break
+        blocks, start, length = [], 0, len(s)
+        while start < length:
+            combined = self._getCombinedPattern(state_name)
+            if combined is None:
+                # try each pattern in turn
+                for pattern, token_type, next_state in self.transitions_lookup[state_name]:
+                    m = pattern.match(s, start)
+                    if m is not None:
+                        end, state_name = m.end(), next_state
+                        break
+                else:
+                    end, token_type = start + 1, self.default_token_type
             else:
-                end, token_type = start + 1, self.default_token_type
+                regex, lookup = combined
+                m = regex.match(s, start)
+                if m is None:
+                    # skip to the next position where a pattern matches
+                    m = regex.search(s, start + 1)
+                    end = length if m is None else m.start()
+                    token_type = self.default_token_type
+                else:
+                    # the outermost group of the matching pattern closes last
+                    end = m.end()
+                    token_type, state_name = lookup[m.lastindex]
             if len(blocks) > 0 and blocks[-1][2] == token_type:
                 blocks[-1][1] = end
             else:
@@ -228,8 +228,12 @@ def len_minus_line_ending(s: str) -> int:
 
 def strip_eol(s: str) -> str:
     '''Returns the string without the line ending characters.'''
-    if s:
-        s = s[:len_minus_line_ending(s)]
+    if not s:
+        return s
+    if s.endswith('\n'):
+        return s[:-2] if s.endswith('\r\n') else s[:-1]
+    if s.endswith('\r'):
+        return s[:-1]
     return s
 
 
@@ -17,15 +17,24 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
-import difflib
+import itertools
 import os
+import re
+import time
 import unicodedata
 
+from array import array
+from collections import Counter, OrderedDict
 from enum import Flag, IntFlag, auto
 from gettext import gettext as _
 from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from diffuse import utils
+from diffuse.diffengines.engine_interface import DiffBudget
+from diffuse.diffengines.engine_registry import theDiffEngines
+from diffuse.diffengines.inline import inline_diff
+from diffuse.layoutcache import is_fixed_width_text, theLayoutCache
+from diffuse.normalizer import TextNormalizer, is_blank
 from diffuse.resources import theResources
 from diffuse.utils import LineEnding
 
@@ -35,7 +44,37 @@ gi.require_version('Gdk', '3.0')
 gi.require_version('Gtk', '3.0')
 gi.require_version('Pango', '1.0')
 gi.require_version('PangoCairo', '1.0')
-from gi.repository import GObject, Gdk, Gtk, Pango, PangoCairo  # type: ignore # noqa: E402
+gi.require_foreign('cairo')
+import cairo  # type: ignore # noqa: E402
+from gi.repository import GLib, GObject, Gdk, Gtk, Pango, PangoCairo  # type: ignore # noqa: E402
+
+# maximum time in seconds spent computing character differences in each idle
+# callback
+_DIFF_PREFETCH_SLICE = 0.01
+
+# maximum time in seconds spent on syntax highlighting while painting a pane
+# and in each idle callback
+_SYNTAX_SLICE = 0.01
+
+# maximum number of strings whose column widths are remembered
+_STRING_WIDTH_CACHE_SIZE = 16384
+
+# a run of equal bytes in the overview map flags
+_DIFFMAP_RUN = re.compile(rb'(.)\1*', re.DOTALL)
+
+# number of blocks kept in each chunk of FileDiffViewerBase.Blocks
+_BLOCK_INDEX_CHUNK = 256
+
+# maximum number of rows searched on each side of an edit for an anchor when
+# realigning after edits, beyond it the blocks containing the edit are
+# realigned completely
+_REALIGN_EDITS_SEARCH = 1000
+
+# translation tables between the overview map flags and their importance when
+# several rows are drawn in the same pixel row: edits, then differences with
+# both neighbours, the right neighbour, the left neighbour and finally text
+_DIFFMAP_PRIORITY = bytes.maketrans(bytes([0, 8, 1, 2, 3, 4]), bytes(range(6)))
+_DIFFMAP_FLAGS = bytes.maketrans(bytes(range(6)), bytes([0, 8, 1, 2, 3, 4]))
 
 
 # the file diff viewer is always in one of these modes defining the cursor,
@@ -59,17 +98,28 @@ class ScrolledWindow(Gtk.Grid):
     def __init__(self, hadj, vadj):
         Gtk.Grid.__init__(self)
         self.position = (0, 0)
-        self.scroll_count = 0
-        self.partial_redraw = False
+
+        # offscreen copy of the viewport's contents, 'buffer_position' is the
+        # scroll position it was painted at
+        self.buffer = None
+        self.spare_buffer = None
+        self.buffer_size = (0, 0)
+        self.buffer_position = (0, 0)
+        # regions of the buffer that must be painted again in content
+        # coordinates
+        self.damage: List[Tuple[int, int, int, int]] = []
+        self.full_redraw = True
 
         self.hadj, self.vadj = hadj, vadj
         vport = Gtk.Viewport()
         darea = Gtk.DrawingArea()
         darea.add_events(Gdk.EventMask.SCROLL_MASK)
         self.darea = darea
-        # replace darea's queue_draw_area with our own so we can tell when
-        # to disable/enable our scrolling optimisation
+        # replace darea's queue_draw and queue_draw_area with our own so we
+        # know which parts of the buffer are stale
+        self.darea_queue_draw = darea.queue_draw
         self.darea_queue_draw_area = darea.queue_draw_area
+        darea.queue_draw = self.redraw
         darea.queue_draw_area = self.redraw_region
         vport.add(darea)
         darea.show()
@@ -91,7 +141,6 @@ class ScrolledWindow(Gtk.Grid):
         vadj.connect('value-changed', self.value_changed_cb)
         darea.connect('configure-event', self.configure_cb)
         darea.connect('scroll-event', self.scroll_cb)
-        darea.connect('draw', self.draw_cb)
 
     # updates the adjustments to match the new widget size
     def configure_cb(self, widget, event):
@@ -120,29 +169,85 @@ class ScrolledWindow(Gtk.Grid):
             utils.step_adjustment(adj, delta)
 
     def value_changed_cb(self, widget):
-        old_x, old_y = self.position
-        pos_x = int(self.hadj.get_value())
-        pos_y = int(self.vadj.get_value())
-        self.position = (pos_x, pos_y)
-        if self.darea.get_window() is not None:
-            # window.scroll() although visually nice, is slow, revert to
-            # queue_draw() if scroll a lot without seeing an expose event
-            if self.scroll_count < 2 and not self.partial_redraw:
-                self.scroll_count += 1
-                self.darea.get_window().scroll(old_x - pos_x, old_y - pos_y)
-            else:
-                self.partial_redraw = False
-                self.darea.queue_draw()
+        self.position = (int(self.hadj.get_value()), int(self.vadj.get_value()))
+        # the buffer is shifted when the viewport is drawn so only the newly
+        # exposed region needs to be painted
+        self.darea_queue_draw()
 
-    def draw_cb(self, widget, cr):
-        self.scroll_count = 0
+    # replacement for darea.queue_draw that discards the whole buffer
+    def redraw(self):
+        self.full_redraw = True
+        self.darea_queue_draw()
 
-    # replacement for darea.queue_draw_area that notifies us when a partial
-    # redraw happened
+    # replacement for darea.queue_draw_area that records the damaged region
     def redraw_region(self, x, y, w, h):
-        self.partial_redraw = True
+        pos_x, pos_y = int(self.hadj.get_value()), int(self.vadj.get_value())
+        self.damage.append((x + pos_x, y + pos_y, w, h))
         self.darea_queue_draw_area(x, y, w, h)
 
+    # draw the viewport from the buffer after calling 'render' to paint the
+    # parts of the buffer that are stale
+    #
+    # 'render' is passed a cairo context for the buffer, clipped to the
+    # region that needs to be painted, and should paint the viewport at the
+    # current scroll position.
+    def paint(self, cr, render):
+        rect = self.darea.get_allocation()
+        w, h = rect.width, rect.height
+        pos_x, pos_y = int(self.hadj.get_value()), int(self.vadj.get_value())
+        if self.buffer is None or self.buffer_size != (w, h):
+            window = self.darea.get_window()
+            self.buffer = window.create_similar_surface(cairo.Content.COLOR, w, h)
+            self.spare_buffer = window.create_similar_surface(cairo.Content.COLOR, w, h)
+            self.buffer_size = (w, h)
+            self.full_redraw = True
+
+        regions = []
+        if self.full_redraw:
+            regions.append((0, 0, w, h))
+        else:
+            old_x, old_y = self.buffer_position
+            dx, dy = old_x - pos_x, old_y - pos_y
+            if abs(dx) >= w or abs(dy) >= h:
+                regions.append((0, 0, w, h))
+            elif dx != 0 or dy != 0:
+                # shift the previous contents and paint the exposed strips
+                buffer_cr = cairo.Context(self.spare_buffer)
+                # only copy the pixels that stay visible, cairo would
+                # otherwise clear the exposed strips in a slower pass
+                buffer_cr.rectangle(max(dx, 0), max(dy, 0), w - abs(dx), h - abs(dy))
+                buffer_cr.clip()
+                buffer_cr.set_operator(cairo.Operator.SOURCE)
+                buffer_cr.set_source_surface(self.buffer, dx, dy)
+                buffer_cr.paint()
+                self.buffer, self.spare_buffer = self.spare_buffer, self.buffer
+                if dy > 0:
+                    regions.append((0, 0, w, dy))
+                elif dy < 0:
+                    regions.append((0, h + dy, w, -dy))
+                if dx > 0:
+                    regions.append((0, 0, dx, h))
+                elif dx < 0:
+                    regions.append((w + dx, 0, -dx, h))
+            for x, y, dw, dh in self.damage:
+                x -= pos_x
+                y -= pos_y
+                if x < w and y < h and x + dw > 0 and y + dh > 0:
+                    regions.append((x, y, dw, dh))
+        self.damage = []
+        self.full_redraw = False
+        self.buffer_position = (pos_x, pos_y)
+
+        buffer_cr = cairo.Context(self.buffer)
+        for region in regions:
+            buffer_cr.save()
+            buffer_cr.rectangle(*region)
+            buffer_cr.clip()
+            render(buffer_cr)
+            buffer_cr.restore()
+        cr.set_source_surface(self.buffer, 0, 0)
+        cr.paint()
+
 
 # widget used to compare and merge text files
 class FileDiffViewerBase(Gtk.Grid):
@@ -151,20 +256,24 @@ class FileDiffViewerBase(Gtk.Grid):
         def __init__(self) -> None:
             # list of lines displayed in this pane (including spacing lines)
             self.lines: List[Optional[FileDiffViewerBase.Line]] = []
-            # high water mark for line length in Pango units (used to determine
-            # the required horizontal scroll range)
-            self.line_lengths = 0
+            # number of text strings of each column width and the widest of
+            # them (used to determine the required horizontal scroll range)
+            self.line_widths: Counter[int] = Counter()
+            self.max_width = 0
             # highest line number
             self.max_line_number = 0
             # cache of syntax highlighting information for each line
             # self.syntax_cache[i] corresponds to self.lines[i]
-            # the list is truncated when a change to a line invalidates a
-            # portion of the cache
-            self.syntax_cache: List[List[Any]] = []
+            # entries for changed lines are set to None, entries following
+            # them are kept and checked against the state they were parsed
+            # with when the cache is brought up to date
+            self.syntax_cache: List[Optional[List[Any]]] = []
+            # number of leading entries of the syntax cache known to be valid
+            self.syntax_valid = 0
             # cache of character differences for each line
             # self.diff_cache[i] corresponds to self.lines[i]
             # portion of the cache are cleared by setting entries to None
-            self.diff_cache: List[List[Any]] = []
+            self.diff_cache: List[Optional[Tuple[int, List[Any]]]] = []
             # mask indicating the type of line endings present
             self.format: LineEnding = LineEnding.NO_FORMAT
             # number of lines with edits
@@ -172,6 +281,15 @@ class FileDiffViewerBase(Gtk.Grid):
 
     # class describing a single line of a pane
     class Line:
+        # there is one instance per line of each pane so avoid a __dict__
+        __slots__ = (
+            'line_number',
+            'text',
+            'is_modified',
+            'modified_text',
+            'compare_string',
+            'align_cache')
+
         def __init__(self, line_number: Optional[int] = None, text: Optional[str] = None) -> None:
             # line number
             self.line_number = line_number
@@ -184,6 +302,11 @@ class FileDiffViewerBase(Gtk.Grid):
             # cache used to speed up comparison of strings
             # this should be cleared whenever the comparison preferences change
             self.compare_string: Optional[str] = None
+            # cache used to speed up line matching, the signature of the
+            # alignment preferences it was computed with and the hash
+            # this is replaced in a single assignment so readers never see a
+            # hash paired with the wrong signature
+            self.align_cache: Optional[Tuple[Tuple[Any, ...], Optional[str]]] = None
 
         # returns the current text for this line
         def getText(self) -> Optional[str]:
@@ -191,6 +314,198 @@ class FileDiffViewerBase(Gtk.Grid):
                 return self.modified_text
             return self.text
 
+    # class describing how the rows are cut into blocks for alignment
+    #
+    # The sizes of the blocks are kept in chunks of about _BLOCK_INDEX_CHUNK
+    # blocks with a Fenwick tree of the number of rows in each chunk, so rows
+    # are located and blocks are resized or replaced without walking or
+    # copying the blocks outside of the affected chunks.  Chunks emptied by
+    # removals are kept until they make up half of the chunks.
+    class Blocks:
+        def __init__(self, sizes: Optional[List[int]] = None) -> None:
+            n = _BLOCK_INDEX_CHUNK
+            sizes = sizes or []
+            self.chunks = [sizes[k:k + n] for k in range(0, len(sizes), n)]
+            # total number of rows
+            self.rows = sum(sizes)
+            # number of empty chunks
+            self.empty = 0
+            # Fenwick tree of the number of rows in each chunk
+            self.tree: List[int] = []
+            self._index()
+
+        # returns the sizes of all blocks
+        def tolist(self) -> List[int]:
+            return list(itertools.chain.from_iterable(self.chunks))
+
+        # recreates the Fenwick tree after the chunks were added or removed
+        def _index(self) -> None:
+            tree = [0]
+            tree.extend(sum(chunk) for chunk in self.chunks)
+            m = len(self.chunks)
+            for c in range(1, m + 1):
+                parent = c + (c & -c)
+                if parent <= m:
+                    tree[parent] += tree[c]
+            self.tree = tree
+
+        # adds 'delta' rows to chunk 'c'
+        def _add(self, c: int, delta: int) -> None:
+            tree, m = self.tree, len(self.chunks)
+            c += 1
+            while c <= m:
+                tree[c] += delta
+                c += c & -c
+
+        # returns the chunk and position of the block containing row 'i' and
+        # the row where it starts, or the number of chunks, 0 and the number of
+        # rows if there is no such block
+        def locate(self, i: int) -> Tuple[int, int, int]:
+            tree, m = self.tree, len(self.chunks)
+            # find the first chunk ending after row 'i'
+            c, start, step = 0, 0, 1 << m.bit_length()
+            while step > 0:
+                k = c + step
+                if k <= m and start + tree[k] <= i:
+                    c = k
+                    start += tree[k]
+                step >>= 1
+            if c == m:
+                return m, 0, self.rows
+            # walk the blocks of the chunk
+            chunk, k = self.chunks[c], 0
+            while start + chunk[k] <= i:
+                start += chunk[k]
+                k += 1
+            return c, k, start
+
+        # returns the row where the first block overlapping rows 'start' to
+        # 'end' starts and the sizes of the overlapping blocks, the block
+        # containing 'start' is always included if there is one
+        def getSpan(self, start: int, end: int) -> Tuple[int, List[int]]:
+            c, k, row = self.locate(start)
+            sizes: List[int] = []
+            i = row
+            for chunk in itertools.islice(self.chunks, c, None):
+                for size in itertools.islice(chunk, k, None):
+                    if i >= end and len(sizes) > 0:
+                        return row, sizes
+                    sizes.append(size)
+                    i += size
+                k = 0
+            return row, sizes
+
+        # returns the sizes of the blocks covering rows 'start' to 'end' with
+        # the blocks extending outside of the rows cut
+        def getCut(self, start: int, end: int) -> List[int]:
+            if start >= end:
+                return []
+            row, sizes = self.getSpan(start, end)
+            if len(sizes) > 0:
+                extra = row + sum(sizes) - end
+                sizes[0] -= start - row
+                if extra > 0:
+                    sizes[-1] -= extra
+            return sizes
+
+        # replaces the blocks covering rows 'start' to 'end' with blocks of
+        # 'sizes', blocks extending outside of the rows are cut
+        #
+        # Returns the row where the replaced blocks start, their sizes and the
+        # sizes of the blocks replacing them.  These are whole blocks so
+        # passing them back in the opposite order reverses the change.
+        def replace(
+                self,
+                start: int,
+                end: int,
+                sizes: List[int]) -> Tuple[int, List[int], List[int]]:
+            chunks = self.chunks
+            c, k, row = self.locate(start)
+            # remove the blocks overlapping the rows, the block containing
+            # 'start' is cut even if no rows are replaced
+            old: List[int] = []
+            i, c2, k2 = row, c, k
+            while c2 < len(chunks):
+                chunk = chunks[c2]
+                n = len(chunk)
+                j = k2
+                while j < n and (i < end or (i < start and len(old) == 0)):
+                    i += chunk[j]
+                    j += 1
+                if j > k2:
+                    removed = chunk[k2:j]
+                    old.extend(removed)
+                    del chunk[k2:j]
+                    self._add(c2, -sum(removed))
+                    if len(chunk) == 0:
+                        self.empty += 1
+                if j < n:
+                    # the next block is outside of the rows
+                    break
+                c2 += 1
+                k2 = 0
+            # keep the parts of the removed blocks outside of the rows
+            new: List[int] = []
+            if start > row:
+                new.append(start - row)
+            new.extend(sizes)
+            if i > end:
+                new.append(i - end)
+            self.rows += sum(new) - sum(old)
+            # insert the new blocks where the old blocks were
+            if len(new) > 0:
+                if c == len(chunks):
+                    # append to the last chunk
+                    if c == 0:
+                        chunks.append([])
+                        self.tree.append(0)
+                        self.empty += 1
+                    c = len(chunks) - 1
+                    k = len(chunks[c])
+                chunk = chunks[c]
+                if len(chunk) == 0:
+                    self.empty -= 1
+                chunk[k:k] = new
+                self._add(c, sum(new))
+                if len(chunk) > 2 * _BLOCK_INDEX_CHUNK:
+                    # split the chunk
+                    n = _BLOCK_INDEX_CHUNK
+                    chunks[c:c + 1] = [chunk[j:j + n] for j in range(0, len(chunk), n)]
+                    self._compact()
+            if self.empty > len(chunks) // 2:
+                self._compact()
+            return row, old, new
+
+        # removes the empty chunks and recreates the Fenwick tree
+        def _compact(self) -> None:
+            self.chunks = [chunk for chunk in self.chunks if len(chunk) > 0]
+            self.empty = 0
+            self._index()
+
+    # class describing the state of the other panes that a pane's new
+    # contents are aligned with by alignContents()
+    #
+    # Everything needed to align the lines is captured on the main thread so
+    # a worker thread never reads the viewer or writes the caches of its
+    # lines.
+    class AlignmentSnapshot:
+        def __init__(
+                self,
+                blocks: List[int],
+                lines: List[List[Any]],
+                generation: int,
+                algorithm: str,
+                normalizer: TextNormalizer,
+                hashes: Dict[int, Optional[str]]) -> None:
+            self.blocks = blocks
+            self.lines = lines
+            # value of FileDiffViewerBase.generation when the snapshot was taken
+            self.generation = generation
+            self.algorithm = algorithm
+            self.normalizer = normalizer
+            # alignment hashes of the lines of the other panes keyed by id()
+            self.hashes = hashes
+
     def __init__(self, n, prefs):
         # verify we have a valid number of panes
         if n < 2:
@@ -203,11 +518,15 @@ class FileDiffViewerBase(Gtk.Grid):
 
         self.set_can_focus(True)
         self.prefs = prefs
-        self.string_width_cache: Dict[str, Optional[int]] = {}
+        # column widths of recently measured strings
+        self.string_width_cache: OrderedDict[str, int] = OrderedDict()
         self.options = {}
 
         # diff blocks
-        self.blocks = []
+        self.blocks = FileDiffViewerBase.Blocks()
+        # incremented whenever the text of a line or the alignment preferences
+        # change so snapshots of the alignment can be checked
+        self.generation = 0
 
         # undos
         self.undos = []
@@ -216,7 +535,27 @@ class FileDiffViewerBase(Gtk.Grid):
 
         # cached data
         self.syntax = ''
-        self.diffmap_cache = None
+        # overview map flags for each row of each pane and the surface they
+        # were last drawn on along with the geometry used
+        self.diffmap_flags: Optional[List[array]] = None
+        self.diffmap_surface: Optional[Tuple[Tuple[int, int, int, int], Any]] = None
+        # rows of the overview map to update once an alignment change is
+        # finished
+        self.diffmap_pending: List[Tuple[int, int]] = []
+        self._updateNormalizers()
+        # idle callback filling the character difference caches
+        self._diff_prefetch_id: Optional[int] = None
+        # idle callback filling the syntax highlighting caches
+        self._syntax_highlight_id: Optional[int] = None
+        # pattern used to draw spacing lines and the values it was created for
+        self._hatch_pattern: Optional[Tuple[Tuple[int, float, float, float], Any]] = None
+
+        # True if some lines were aligned approximately as the time limit
+        # for alignment was exceeded
+        self.approximate_alignment = False
+        # whether the lines of each pair of neighbouring panes were aligned
+        # approximately, entry f is for panes f and f + 1
+        self.approximate_pairs: Tuple[bool, ...] = (False, ) * (n - 1)
 
         # editing mode
         self.mode = EditMode.LINE
@@ -318,6 +657,7 @@ class FileDiffViewerBase(Gtk.Grid):
 
         # create panes
         self.dareas: List[Gtk.DrawingArea] = []
+        self.scrolledwindows: List[ScrolledWindow] = []
         self.panes: List[FileDiffViewerBase.Pane] = []
         self.hadj = Gtk.Adjustment(
             value=0,
@@ -348,6 +688,7 @@ class FileDiffViewerBase(Gtk.Grid):
             darea.connect('motion-notify-event', self.darea_motion_notify_cb, i)
             darea.connect('draw', self.darea_draw_cb, i)
             self.dareas.append(darea)
+            self.scrolledwindows.append(sw)
             self.attach(sw, i, 1, 1, 1)
             sw.show()
 
@@ -395,6 +736,11 @@ class FileDiffViewerBase(Gtk.Grid):
     # are known and the scroll bar can be moved to the first difference
     def _realise_cb(self, widget):
         self.im_context.set_client_window(self.get_window())
+        self.goToStartLine()
+
+    # moves the cursor to the line requested in the startup options or to the
+    # first difference
+    def goToStartLine(self) -> None:
         try:
             self.go_to_line(self.options['line'])
         except KeyError:
@@ -413,10 +759,20 @@ class FileDiffViewerBase(Gtk.Grid):
     # updates the display font and resizes viewports as necessary
     def setFont(self, font):
         self.font = font
+        # this is also reached from prefsUpdated()
+        theLayoutCache.clear()
         metrics = self.get_pango_context().get_metrics(self.font)
         self.font_height = max(_pixels(metrics.get_ascent() + metrics.get_descent()), 1)
         self.digit_width = metrics.get_approximate_digit_width()
-        self.updateSize(True)
+        # width of each character if they can be measured arithmetically
+        self.char_width = theLayoutCache.getFixedCharWidth(self, self.font)
+        # discard everything positioned with the old font
+        for pane in self.panes:
+            del pane.diff_cache[:]
+            for item in pane.syntax_cache:
+                if item is not None:
+                    item[3] = None
+        self.updateSize()
         self.diffmap.queue_draw()
 
     # returns the 'column width' for a string -- used to help position
@@ -425,6 +781,9 @@ class FileDiffViewerBase(Gtk.Grid):
     def stringWidth(self, s: str) -> int:
         if not self.prefs.getBool('display_show_whitespace'):
             s = utils.strip_eol(s)
+        if s.isascii() and s.isprintable():
+            # every character is one column wide
+            return len(s)
         col = 0
         for c in s:
             try:
@@ -450,6 +809,46 @@ class FileDiffViewerBase(Gtk.Grid):
             col += w
         return col
 
+    # returns the 'column width' for a string using a size-bounded cache
+    def _cachedStringWidth(self, s: str) -> int:
+        cache = self.string_width_cache
+        w = cache.get(s)
+        if w is None:
+            cache[s] = w = self.stringWidth(s)
+            if len(cache) > _STRING_WIDTH_CACHE_SIZE:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(s)
+        return w
+
+    # adds 'count' to the number of strings with the column widths of the
+    # text of 'line'
+    def _countLineWidths(self, pane: Pane, line: Line, count: int) -> None:
+        widths = pane.line_widths
+        for s in (line.text, line.modified_text if line.is_modified else None):
+            if s is not None:
+                w = self._cachedStringWidth(s)
+                n = widths[w] + count
+                if n > 0:
+                    widths[w] = n
+                    pane.max_width = max(pane.max_width, w)
+                else:
+                    del widths[w]
+                    if w == pane.max_width:
+                        pane.max_width = max(widths, default=0)
+
+    # re-computes the column widths of all lines in 'pane'
+    def _computeLineWidths(self, pane: Pane) -> None:
+        texts = []
+        for line in pane.lines:
+            if line is not None:
+                if line.text is not None:
+                    texts.append(line.text)
+                if line.is_modified and line.modified_text is not None:
+                    texts.append(line.modified_text)
+        pane.line_widths = Counter(map(self._cachedStringWidth, texts))
+        pane.max_width = max(pane.line_widths, default=0)
+
     # returns the 'column width' for a single character created at column 'i'
     def characterWidth(self, i: int, c: str) -> int:
         try:
@@ -551,6 +950,7 @@ class FileDiffViewerBase(Gtk.Grid):
             # invalidate the syntax caches
             for pane in self.panes:
                 pane.syntax_cache = []
+                pane.syntax_valid = 0
             self.emit('syntax-changed', new_syntax)
             # force all panes to redraw
             for darea in self.dareas:
@@ -640,46 +1040,20 @@ class FileDiffViewerBase(Gtk.Grid):
 
     # returns the width of a string in Pango units
     def getTextWidth(self, text: str) -> int:
-        if len(text) == 0:
-            return 0
-        layout = self.create_pango_layout(text)
-        layout.set_font_description(self.font)
-        return layout.get_size()[0]
+        char_width = self.char_width
+        if char_width is not None and is_fixed_width_text(text):
+            # fast path for fixed pitch fonts
+            return char_width * len(text)
+        return theLayoutCache.getWidth(self, self.font, text)
 
     # updates the size of the viewport
-    # set 'compute_width' to False if the high water mark for line length can
-    # be used to determine the required width for the viewport, use True for
-    # this value otherwise
-    def updateSize(self, compute_width: bool, f: Optional[int] = None) -> None:
+    def updateSize(self) -> None:
         digit_width, stringWidth = self.digit_width, self.stringWidth
-        string_width_cache = self.string_width_cache
-        if compute_width:
-            if f is None:
-                panes = self.panes
-            else:
-                panes = [self.panes[f]]
-            for pane in panes:
-                del pane.syntax_cache[:]
-                del pane.diff_cache[:]
-                # re-compute the high water mark
-                pane.line_lengths = 0
-                for line in pane.lines:
-                    if line is not None:
-                        line.compare_string = None
-                        text = [line.text]
-                        if line.is_modified:
-                            text.append(line.modified_text)
-                        for s in text:
-                            if s is not None:
-                                swc = string_width_cache.get(s, None)
-                                if swc is None:
-                                    string_width_cache[s] = swc = stringWidth(s)
-                                pane.line_lengths = max(pane.line_lengths, digit_width * swc)
         # compute the maximum extents
         num_lines, line_lengths = 0, 0
         for pane in self.panes:
             num_lines = max(num_lines, len(pane.lines))
-            line_lengths = max(line_lengths, pane.line_lengths)
+            line_lengths = max(line_lengths, digit_width * pane.max_width)
         # account for any preedit text
         if self.im_preedit is not None:
             w = self._preedit_layout().get_size()[0]
@@ -735,6 +1109,54 @@ class FileDiffViewerBase(Gtk.Grid):
         pane.format = fmt
         self.emit('format-changed', f, fmt)
 
+    # Undo for changes to whether the alignment is approximate
+    class SetApproximateAlignmentUndo:
+        def __init__(self, pairs: Tuple[bool, ...], old_pairs: Tuple[bool, ...]) -> None:
+            self.data = (pairs, old_pairs)
+
+        def undo(self, viewer):
+            _, old_pairs = self.data
+            viewer.setApproximatePairs(old_pairs)
+
+        def redo(self, viewer):
+            pairs, _ = self.data
+            viewer.setApproximatePairs(pairs)
+
+    # records which pairs of neighbouring panes had lines aligned
+    # approximately
+    def setApproximatePairs(self, pairs: Tuple[bool, ...]) -> None:
+        if pairs != self.approximate_pairs:
+            if self.undoblock is not None:
+                # create an Undo object for the action
+                self.addUndo(FileDiffViewerBase.SetApproximateAlignmentUndo(
+                    pairs, self.approximate_pairs))
+            self.approximate_pairs = pairs
+            approximate = any(pairs)
+            if approximate != self.approximate_alignment:
+                self.approximate_alignment = approximate
+                self.emit('approximate-alignment-changed', approximate)
+
+    # records whether the lines of panes 'f' to 'f2' were aligned
+    # approximately with each other, all panes by default
+    def setApproximateAlignment(
+            self,
+            approximate: bool,
+            f: int = 0,
+            f2: Optional[int] = None) -> None:
+        pairs = list(self.approximate_pairs)
+        if f2 is None:
+            f2 = len(pairs)
+        f, f2 = max(f, 0), min(f2, len(pairs))
+        pairs[f:f2] = (f2 - f) * [approximate]
+        self.setApproximatePairs(tuple(pairs))
+
+    # creates a budget for the time spent automatically aligning lines
+    def _createAlignBudget(self) -> DiffBudget:
+        limit = self.prefs.getInt('align_time_limit')
+        if limit > 0:
+            return DiffBudget(limit / 1000)
+        return DiffBudget()
+
     # Undo for the creation of Line objects
     class InstanceLineUndo:
         def __init__(self, f: int, i: int, reverse: bool) -> None:
@@ -756,10 +1178,14 @@ class FileDiffViewerBase(Gtk.Grid):
             self.addUndo(FileDiffViewerBase.InstanceLineUndo(f, i, reverse))
         pane = self.panes[f]
         if reverse:
+            line = pane.lines[i]
+            if line is not None:
+                self._countLineWidths(pane, line, -1)
             pane.lines[i] = None
         else:
             line = FileDiffViewerBase.Line()
             pane.lines[i] = line
+        self._updateDiffmapRows(i, i + 1)
 
     # Undo for changing the text for a Line object
     class UpdateLineTextUndo:
@@ -774,6 +1200,58 @@ class FileDiffViewerBase(Gtk.Grid):
             f, i, _, _, is_modified, text = self.data
             viewer.updateLineText(f, i, is_modified, text)
 
+    # discard the overview map so it is rebuilt the next time it is drawn
+    def _invalidateDiffmap(self) -> None:
+        self.diffmap_flags = None
+        self.diffmap_surface = None
+        self.diffmap.queue_draw()
+
+    # recompute the overview map flags for the rows from 'start' to 'end'
+    #
+    # flags & 1 indicates differences with the pane to the left
+    # flags & 2 indicates differences with the pane to the right
+    # flags & 4 indicates modified lines
+    # flags & 8 indicates regular lines with text
+    def _updateDiffmapRows(self, start: int, end: int) -> None:
+        all_flags = self.diffmap_flags
+        if all_flags is not None:
+            changed = False
+            end = min(end, len(all_flags[0]))
+            n = len(self.panes)
+            getCompareString, getLine = self.getCompareString, self.getLine
+            for i in range(start, end):
+                nextflag = 0
+                s1 = getCompareString(0, i)
+                # iterate over each pane
+                for f in range(n):
+                    flag = nextflag
+                    nextflag = 0
+                    s0 = s1
+                    # compare with neighbour to the right
+                    if f + 1 < n:
+                        s1 = getCompareString(f + 1, i)
+                        if s0 != s1:
+                            flag |= 2
+                            nextflag |= 1
+                    line = getLine(f, i)
+                    if line is not None and line.is_modified:
+                        # modified line
+                        flag = 4
+                    elif line is None or line.getText() is None:
+                        # empty line
+                        flag = 0
+                    elif flag == 0:
+                        # regular line
+                        flag = 8
+                    flags = all_flags[f]
+                    if flags[i] != flag:
+                        flags[i] = flag
+                        changed = True
+            if not changed:
+                return
+            self.diffmap_surface = None
+        self.diffmap.queue_draw()
+
     def getMapFlags(self, f: int, i: int) -> int:
         flags = 0
         compare_text = self.getCompareString(f, i)
@@ -790,7 +1268,7 @@ class FileDiffViewerBase(Gtk.Grid):
     def updateLineText(self, f, i, is_modified, text):
         pane = self.panes[f]
         line = pane.lines[i]
-        flags = self.getMapFlags(f, i)
+        self._countLineWidths(pane, line, -1)
         if self.undoblock is not None:
             # create an Undo object for the action
             self.addUndo(FileDiffViewerBase.UpdateLineTextUndo(
@@ -810,11 +1288,12 @@ class FileDiffViewerBase(Gtk.Grid):
         line.is_modified = is_modified
         line.modified_text = text
         line.compare_string = None
+        line.align_cache = None
+        self.generation += 1
 
         # update/invalidate all relevant caches and queue widgets for redraw
-        if text is not None:
-            pane.line_lengths = max(pane.line_lengths, self.digit_width * self.stringWidth(text))
-        self.updateSize(False)
+        self._countLineWidths(pane, line, 1)
+        self.updateSize()
 
         fs = []
         if f > 0:
@@ -827,46 +1306,63 @@ class FileDiffViewerBase(Gtk.Grid):
                 otherpane.diff_cache[i] = None
             self._queue_draw_lines(fn, i)
         if i < len(pane.syntax_cache):
-            del pane.syntax_cache[i:]
+            pane.syntax_cache[i] = None
+            pane.syntax_valid = min(pane.syntax_valid, i)
         if i < len(pane.diff_cache):
             pane.diff_cache[i] = None
         self.dareas[f].queue_draw()
-        if self.getMapFlags(f, i) != flags:
-            self.diffmap_cache = None
-            self.diffmap.queue_draw()
+        self._updateDiffmapRows(i, i + 1)
 
-    # Undo for inserting a spacing line in a single pane
-    class InsertNullUndo:
-        def __init__(self, f: int, i: int, reverse: bool) -> None:
-            self.data = (f, i, reverse)
+    # Undo for changing the spacing lines of a range of rows in a single pane
+    class SpliceNullsUndo:
+        def __init__(self, f: int, i: int, old_layout: bytes, layout: bytes) -> None:
+            self.data = (f, i, old_layout, layout)
 
         def undo(self, viewer):
-            f, i, reverse = self.data
-            viewer.insertNull(f, i, not reverse)
+            f, i, old_layout, layout = self.data
+            viewer.spliceNulls(f, i, len(layout), old_layout)
 
         def redo(self, viewer):
-            f, i, reverse = self.data
-            viewer.insertNull(f, i, reverse)
+            f, i, old_layout, layout = self.data
+            viewer.spliceNulls(f, i, len(old_layout), layout)
 
-    # insert a spacing line at line 'i' in pane 'f'
-    # this caller must ensure the blocks and number of lines in each pane
-    # are valid again
-    def insertNull(self, f: int, i: int, reverse: bool) -> None:
-        if self.undoblock is not None:
-            # create an Undo object for the action
-            self.addUndo(FileDiffViewerBase.InsertNullUndo(f, i, reverse))
+    # rearrange the 'n' rows starting at row 'i' in pane 'f' so the lines are
+    # placed where 'layout' is non-zero and spacing lines everywhere else
+    #
+    # 'layout' must have a non-zero entry for each line of the rows, use
+    # _get_layout() to describe a list of rows.  The whole range is replaced
+    # at once so the cost does not depend on the number of spacing lines.
+    # The caller must ensure the blocks and number of lines in each pane are
+    # valid again.
+    def spliceNulls(self, f: int, i: int, n: int, layout: bytes) -> None:
         pane = self.panes[f]
         lines = pane.lines
-        # update/invalidate all relevant caches
-        if reverse:
-            del lines[i]
-            if i < len(pane.syntax_cache):
-                del pane.syntax_cache[i]
-        else:
-            lines.insert(i, None)
-            if i < len(pane.syntax_cache):
-                state = pane.syntax_cache[i][0]
-                pane.syntax_cache.insert(i, [state, state, None, None])
+        i2 = i + n
+        old_rows = lines[i:i2]
+        old_layout = _get_layout(old_rows)
+        if old_layout == layout:
+            return
+        if self.undoblock is not None:
+            # create an Undo object for the action
+            self.addUndo(FileDiffViewerBase.SpliceNullsUndo(f, i, old_layout, layout))
+        kept_lines = iter([line for line in old_rows if line is not None])
+        lines[i:i2] = [next(kept_lines) if v else None for v in layout]
+        # update/invalidate all relevant caches, the entries of the lines
+        # are kept and spacing lines get empty entries
+        if self.diffmap_flags is not None:
+            flags = self.diffmap_flags[f]
+            kept_flags = iter([v for v, k in zip(flags[i:i2], old_layout) if k])
+            flags[i:i2] = array('B', [next(kept_flags) if v else 0 for v in layout])
+            self.diffmap_surface = None
+        syntax_cache = pane.syntax_cache
+        if i < len(syntax_cache):
+            if i2 <= len(syntax_cache):
+                kept_syntax = iter([v for v, k in zip(syntax_cache[i:i2], old_layout) if k])
+                syntax_cache[i:i2] = [next(kept_syntax) if v else None for v in layout]
+            else:
+                # the remaining entries will be recomputed when needed
+                del syntax_cache[i:]
+            pane.syntax_valid = min(pane.syntax_valid, i)
 
     # Undo for manipulating a section of the line matching data
     class InvalidateLineMatchingUndo:
@@ -895,8 +1391,8 @@ class FileDiffViewerBase(Gtk.Grid):
                 else:
                     del pane.diff_cache[i:]
             self.dareas[f].queue_draw()
-        self.diffmap_cache = None
-        self.diffmap.queue_draw()
+        # the overview map is updated once the alignment change is finished
+        self.diffmap_pending.append((i, i + new_n))
 
     # Undo for alignment changes
     class AlignmentChangeUndo:
@@ -917,22 +1413,18 @@ class FileDiffViewerBase(Gtk.Grid):
             # create an Undo object for the action
             self.addUndo(FileDiffViewerBase.AlignmentChangeUndo(finished))
         if finished:
-            self.updateSize(False)
+            for start, end in self.diffmap_pending:
+                self._updateDiffmapRows(start, end)
+            del self.diffmap_pending[:]
+            self.updateSize()
 
     # updates the alignment of 'n' lines starting from 'i'
     def updateAlignment(self, i, n, lines):
         self.alignmentChange(False)
         new_n = len(lines[0])
-        i2 = i + n
         # insert spacing lines
         for f in range(len(self.panes)):
-            for j in range(i2-1, i-1, -1):
-                if self.getLine(f, j) is None:
-                    self.insertNull(f, j, True)
-            temp = lines[f]
-            for j in range(new_n):
-                if temp[j] is None:
-                    self.insertNull(f, i + j, False)
+            self.spliceNulls(f, i, n, _get_layout(lines[f]))
         # update line matching for this block
 
         # FIXME: we should be able to do something more intelligent here...
@@ -943,32 +1435,34 @@ class FileDiffViewerBase(Gtk.Grid):
 
     # Undo for changing how lines are cut into blocks for alignment
     class UpdateBlocksUndo:
-        def __init__(self, old_blocks, blocks):
-            self.data = (old_blocks, blocks)
+        def __init__(self, i: int, old_blocks: List[int], blocks: List[int]) -> None:
+            self.data = (i, old_blocks, blocks)
 
         def undo(self, viewer):
-            old_blocks, _ = self.data
-            viewer.updateBlocks(old_blocks)
+            i, old_blocks, blocks = self.data
+            viewer.replaceBlocks(i, i + sum(blocks), old_blocks)
 
         def redo(self, viewer):
-            _, blocks = self.data
-            viewer.updateBlocks(blocks)
+            i, old_blocks, blocks = self.data
+            viewer.replaceBlocks(i, i + sum(old_blocks), blocks)
 
     # change how lines are cut into blocks for alignment
-    def updateBlocks(self, blocks):
-        if self.undoblock is not None:
+    def updateBlocks(self, blocks: List[int]) -> None:
+        self.replaceBlocks(0, self.blocks.rows, blocks)
+
+    # change how rows 'start' to 'end' are cut into blocks for alignment, the
+    # blocks extending outside of the rows are cut
+    def replaceBlocks(self, start: int, end: int, blocks: List[int]) -> None:
+        i, old_blocks, new_blocks = self.blocks.replace(start, end, blocks)
+        if self.undoblock is not None and old_blocks != new_blocks:
             # create an Undo object for the action
-            self.addUndo(FileDiffViewerBase.UpdateBlocksUndo(self.blocks, blocks))
-        self.blocks = blocks
+            self.addUndo(FileDiffViewerBase.UpdateBlocksUndo(i, old_blocks, new_blocks))
 
     # insert 'n' blank lines in all panes
     def insertLines(self, i: int, n: int) -> None:
         # insert lines
         self.updateAlignment(i, 0, [n * [None] for pane in self.panes])
-        pre, post = _cut_blocks(i, self.blocks)
-        pre.append(n)
-        pre.extend(post)
-        self.updateBlocks(pre)
+        self.replaceBlocks(i, i, [n])
 
         # update selection
         if self.current_line >= i:
@@ -976,9 +1470,7 @@ class FileDiffViewerBase(Gtk.Grid):
         if self.selection_line >= i:
             self.selection_line += n
         # queue redraws
-        self.updateSize(False)
-        self.diffmap_cache = None
-        self.diffmap.queue_draw()
+        self.updateSize()
 
     # remove a line
     def removeSpacerLines(self, i: int, n: int, skip: int = -1) -> int:
@@ -1003,8 +1495,11 @@ class FileDiffViewerBase(Gtk.Grid):
 
         nremoved = len(removed)
         if nremoved > 0:
-            # update blocks
-            bi, bii, blocks = 0, 0, self.blocks[:]
+            # update blocks starting from the block containing the first
+            # removed line
+            start, blocks = self.blocks.getSpan(max(removed[0] - 1, 0), removed[-1] + 1)
+            end = start + sum(blocks)
+            bi, bii = 0, start
             for j in removed:
                 while bii + blocks[bi] < j:
                     bii += blocks[bi]
@@ -1014,13 +1509,14 @@ class FileDiffViewerBase(Gtk.Grid):
                 else:
                     blocks[bi] -= 1
                 bii += 1
-            self.updateBlocks(blocks)
+            self.replaceBlocks(start, end, blocks)
 
             self.alignmentChange(False)
-            removed.reverse()
-            for j in removed:
-                for f in range(npanes):
-                    self.insertNull(f, j, True)
+            removed_set = set(removed)
+            for f in range(npanes):
+                rows = self.panes[f].lines[i:i + n]
+                self.spliceNulls(f, i, n, _get_layout(
+                    [line for j, line in enumerate(rows, i) if j not in removed_set]))
             # FIXME: we should be able to do something more intelligent here...
             # the syntax cache will become invalidated.... we don't really need
             # to do that...
@@ -1028,9 +1524,7 @@ class FileDiffViewerBase(Gtk.Grid):
             self.alignmentChange(True)
 
             # queue redraws
-            self.updateSize(False)
-            self.diffmap_cache = None
-            self.diffmap.queue_draw()
+            self.updateSize()
         return nremoved
 
     # Undo for replacing the lines for a single pane with a new set
@@ -1058,54 +1552,56 @@ class FileDiffViewerBase(Gtk.Grid):
         old_num_edits = pane.num_edits
         pane.num_edits = 0
         for line in new_lines:
-            if line is not None and line.is_modified:
-                pane.num_edits += 1
+            if line is not None:
+                # lines restored by an undo may have been compared using
+                # other preferences
+                line.compare_string = None
+                if line.is_modified:
+                    pane.num_edits += 1
         if pane.num_edits != old_num_edits:
             self.emit('num-edits-changed', f)
         del pane.syntax_cache[:]
+        pane.syntax_valid = 0
+        del pane.diff_cache[:]
         pane.max_line_number = new_max_num
+        self._computeLineWidths(pane)
         self.dareas[f].queue_draw()
-        self.updateSize(True, f)
-        self.diffmap_cache = None
-        self.diffmap.queue_draw()
+        self.updateSize()
+        self._invalidateDiffmap()
 
     # create a hash for a line to use for line matching
+    #
+    # The hash is cached on the line until its text or the alignment
+    # preferences change.
     def _alignmentHash(self, line: Line) -> Optional[str]:
+        normalizer = self.align_normalizer
+        cache = line.align_cache
+        if cache is not None and cache[0] == normalizer.signature:
+            return cache[1]
         text = line.getText()
-        if text is None:
-            return None
-        pref = self.prefs.getBool
-        if pref('align_ignore_whitespace'):
-            # strip all white space from the string
-            for c in utils.whitespace:
-                text = text.replace(c, '')
-        else:
-            # hashes for non-null lines should start with '+' to distinguish
-            # them from blank lines
-            if pref('align_ignore_endofline'):
-                text = utils.strip_eol(text)
-            if pref('align_ignore_blanklines') and _is_blank(text):
-                # consider all lines containing only white space as the same
-                return ''
-
-            if pref('align_ignore_whitespace_changes'):
-                # replace all blocks of white space with a single space
-                pc = True
-                r: List[str] = []
-                for c in text:
-                    if c in utils.whitespace:
-                        if pc:
-                            r.append(' ')
-                            pc = False
-                    else:
-                        r.append(c)
-                        pc = True
-                text = ''.join(r)
-        if pref('align_ignore_case'):
-            # convert everything to upper case
-            text = text.upper()
+        if text is not None:
+            text = normalizer(text)
+        line.align_cache = (normalizer.signature, text)
         return text
 
+    # rebuild the text normalisers used to compare lines from the current
+    # preferences
+    def _updateNormalizers(self) -> None:
+        pref = self.prefs.getBool
+        self.align_normalizer = TextNormalizer(
+            pref('align_ignore_endofline'),
+            pref('align_ignore_blanklines'),
+            pref('align_ignore_whitespace'),
+            pref('align_ignore_whitespace_changes'),
+            pref('align_ignore_case'),
+            blank='')
+        self.display_normalizer = TextNormalizer(
+            pref('display_ignore_endofline'),
+            pref('display_ignore_blanklines'),
+            pref('display_ignore_whitespace'),
+            pref('display_ignore_whitespace_changes'),
+            pref('display_ignore_case'))
+
     # align sets of lines by inserting null spacers and updating the size
     # of blocks to which they belong
     #
@@ -1113,50 +1609,84 @@ class FileDiffViewerBase(Gtk.Grid):
     # of lines are aligned (leftlines[-1] and rightlines[0]). Any spacers
     # needed for alignment are inserted in all lists of lines for a particular
     # side to keep them all in sync.
-    def alignBlocks(self, leftblocks, leftlines, rightblocks, rightlines):
+    #
+    # If 'budget' is exceeded, the alignment is approximated.  Without a
+    # budget the alignment is always exact.
+    #
+    # The lines are hashed with 'get_hash' and compared with 'algorithm', by
+    # default the cached hashes and the algorithm from the preferences are
+    # used.
+    def alignBlocks(
+            self,
+            leftblocks,
+            leftlines,
+            rightblocks,
+            rightlines,
+            budget=None,
+            get_hash=None,
+            algorithm=None):
+        if get_hash is None:
+            get_hash = self._alignmentHash
+        if algorithm is None:
+            algorithm = self.prefs.getString('align_algorithm')
         blocks = (leftblocks, rightblocks)
         lines = (leftlines, rightlines)
         # get the inner lines we are to match
         middle = (leftlines[-1], rightlines[0])
         # eliminate any existing spacer lines
-        mlines = ([line for line in middle[0] if line is not None],
-                  [line for line in middle[1] if line is not None])
-        s1, s2 = mlines
-        n1, n2 = 0, 0
-        # hash lines according to the alignment preferences
-        t1 = [self._alignmentHash(s) for s in s1]
-        t2 = [self._alignmentHash(s) for s in s2]
+        s1 = [line for line in middle[0] if line is not None]
+        s2 = [line for line in middle[1] if line is not None]
+        # hash lines according to the alignment preferences and replace the
+        # hashes with small integer IDs so the diff compares integers instead
+        # of strings
+        t1, t2 = _intern_hashes([get_hash(s) for s in s1], [get_hash(s) for s in s2])
         # align s1 and s2 by inserting spacer lines
         # this will be used to determine which lines from the inner lists of
         # lines should be neighbours
-        for block in _patience_diff(t1, t2):
-            delta = (n1 + block[0]) - (n2 + block[1])
+        if budget is None:
+            budget = DiffBudget()
+        matches = theDiffEngines.diff(algorithm, t1, t2, budget)
+        # build the aligned lists in a single pass
+        m1: List[Optional[FileDiffViewerBase.Line]] = []
+        m2: List[Optional[FileDiffViewerBase.Line]] = []
+        i1, i2 = 0, 0
+        for block in matches:
+            m1.extend(s1[i1:block[0]])
+            m2.extend(s2[i2:block[1]])
+            i1, i2 = block[0], block[1]
+            delta = len(m1) - len(m2)
             if delta < 0:
                 # insert spacer lines in s1
-                i = n1 + block[0]
-                s1[i:i] = -delta * [None]
-                n1 -= delta
+                m1.extend(-delta * [None])
             elif delta > 0:
                 # insert spacer lines in s2
-                i = n2 + block[1]
-                s2[i:i] = delta * [None]
-                n2 += delta
-        nmatch = len(s1)
+                m2.extend(delta * [None])
+        m1.extend(s1[i1:])
+        m2.extend(s2[i2:])
+        mlines = (m1, m2)
+        nmatch = len(m1)
 
         # insert spacer lines in leftlines and rightlines and increase the
         # size of blocks in leftblocks and rightblocks as spacer lines are
         # inserted
         #
-        # advance one row at a time inserting spacer lines as we go
+        # advance one row at a time noting where spacer lines are needed,
+        # the lists of lines are rebuilt with the spacer lines once all of
+        # the rows have been processed
         # 'i' indicates which row we are processing
         # 'k' indicates which pair of neighbors we are processing
+        # 'nulls[j]' lists the rows where spacer lines are inserted for side 'j'
         i, k = 0, 0
+        sizes = [len(m) for m in middle]
+        nulls: Tuple[List[int], List[int]] = ([], [])
         bi = [0, 0]
         bn = [0, 0]
         while True:
+            # the current row of each side's inner list of lines
+            rows = (i - len(nulls[0]), i - len(nulls[1]))
             # if we have reached the end of the list for any side, it needs
             # spacer lines to align with the other side
-            insert = [i >= len(m) for m in middle]
+            insert = [rows[0] >= sizes[0], rows[1] >= sizes[1]]
             if insert == [True, True]:
                 # we have reached the end of both inner lists of lines
                 # we are done
@@ -1167,7 +1697,7 @@ class FileDiffViewerBase(Gtk.Grid):
                 accept = True
                 for j in range(2):
                     m = mlines[j][k]
-                    if middle[j][i] is not m:
+                    if middle[j][rows[j]] is not m:
                         # this line does not correspond to the pair of
                         # neighbours we expected
                         if m is None:
@@ -1183,33 +1713,74 @@ class FileDiffViewerBase(Gtk.Grid):
                     k += 1
                 else:
                     # insert spacer lines as needed
-                    insert = [m[i] is not None for m in middle]
+                    insert = [middle[0][rows[0]] is not None, middle[1][rows[1]] is not None]
             for j in range(2):
                 if insert[j]:
                     # insert spacers lines for side 'j'
-                    for temp in lines[j]:
-                        temp.insert(i, None)
+                    nulls[j].append(i)
                     blocksj = blocks[j]
-                    bij = bi[j]
-                    bnj = bn[j]
                     # append a new block if needed
                     if len(blocksj) == 0:
                         blocksj.append(0)
-                    # advance to the current block
-                    while bnj + blocksj[bij] < i:
-                        bnj += blocksj[bij]
-                        bij += 1
+                    # advance to the current block, rows are processed in
+                    # order so the search continues from the previous block
+                    while bn[j] + blocksj[bi[j]] < i:
+                        bn[j] += blocksj[bi[j]]
+                        bi[j] += 1
                     # increase the current block size
-                    blocksj[bij] += 1
+                    blocksj[bi[j]] += 1
             # advance to the next row
             i += 1
+        for j in range(2):
+            if nulls[j]:
+                for temp in lines[j]:
+                    temp[:] = _insert_nulls(temp, nulls[j])
 
     # replace the contents of pane 'f' with the strings list of strings 'ss'
     def replaceContents(self, f, ss):
-        self.alignmentChange(False)
-        # determine the format for the text
-        self.setFormat(f, _get_format(ss))
+        budget = self._createAlignBudget()
+        contents = self.alignContents(f, ss, self.snapshotAlignment(f), budget)
+        self.applyContents(f, contents)
 
+    # returns the state of the panes other than 'f' needed by alignContents()
+    #
+    # The alignment hashes of the lines are computed here so the lines are
+    # only modified on the main thread.
+    def snapshotAlignment(self, f: int) -> AlignmentSnapshot:
+        hashes: Dict[int, Optional[str]] = {}
+        for f_idx, pane in enumerate(self.panes):
+            if f_idx != f:
+                for line in pane.lines:
+                    if line is not None:
+                        hashes[id(line)] = self._alignmentHash(line)
+        return FileDiffViewerBase.AlignmentSnapshot(
+            self.blocks.tolist(),
+            [pane.lines[:] for pane in self.panes],
+            self.generation,
+            self.prefs.getString('align_algorithm'),
+            self.align_normalizer,
+            hashes)
+
+    # returns True if the blocks, lines, text and alignment preferences still
+    # match 'snapshot'
+    def isSnapshotCurrent(self, snapshot: AlignmentSnapshot) -> bool:
+        if snapshot.generation != self.generation or snapshot.blocks != self.blocks.tolist():
+            return False
+        if snapshot.algorithm != self.prefs.getString('align_algorithm'):
+            return False
+        for pane_lines, pane in zip(snapshot.lines, self.panes):
+            if pane_lines != pane.lines:
+                return False
+        return True
+
+    # creates lines for the list of strings 'ss' and aligns them with the
+    # other panes described by 'snapshot'
+    #
+    # Only 'snapshot' is used so this can be called from a worker thread.  The
+    # result should be passed to applyContents() while 'snapshot' is still
+    # current.
+    def alignContents(self, f, ss, snapshot, budget):
+        snapshot_blocks, snapshot_lines = snapshot.blocks, snapshot.lines
         # create an initial set of blocks for the lines
         blocks = []
         n = len(ss)
@@ -1218,25 +1789,42 @@ class FileDiffViewerBase(Gtk.Grid):
         # create line objects for the text
         Line = FileDiffViewerBase.Line
         mid = [[Line(j + 1, ss[j]) for j in range(n)]]
+        # hash the new lines without caching the hashes on them
+        hashes = snapshot.hashes.copy()
+        normalizer = snapshot.normalizer
+        for line in mid[0]:
+            hashes[id(line)] = normalizer(line.text)
+        algorithm = snapshot.algorithm
+
+        def get_hash(line):
+            return hashes[id(line)]
 
         if f > 0:
             # align with panes to the left
             # use copies so the originals can be used by the Undo object
-            leftblocks = self.blocks[:]
-            leftlines = [pane.lines[:] for pane in self.panes[:f]]
+            leftblocks = snapshot_blocks[:]
+            leftlines = [lines[:] for lines in snapshot_lines[:f]]
             _remove_null_lines(leftblocks, leftlines)
-            self.alignBlocks(leftblocks, leftlines, blocks, mid)
+            self.alignBlocks(leftblocks, leftlines, blocks, mid, budget, get_hash, algorithm)
             mid[:0] = leftlines
             blocks = _merge_blocks(leftblocks, blocks)
-        if f + 1 < len(self.panes):
+        if f + 1 < len(snapshot_lines):
             # align with panes to the right
             # use copies so the originals can be used by the Undo object
-            rightblocks = self.blocks[:]
-            rightlines = [pane.lines[:] for pane in self.panes[f + 1:]]
+            rightblocks = snapshot_blocks[:]
+            rightlines = [lines[:] for lines in snapshot_lines[f + 1:]]
             _remove_null_lines(rightblocks, rightlines)
-            self.alignBlocks(blocks, mid, rightblocks, rightlines)
+            self.alignBlocks(blocks, mid, rightblocks, rightlines, budget, get_hash, algorithm)
             mid.extend(rightlines)
             blocks = _merge_blocks(blocks, rightblocks)
+        return _get_format(ss), n, mid, blocks, budget.exceeded
+
+    # replace the contents of pane 'f' with the result of alignContents()
+    def applyContents(self, f, contents):
+        fmt, n, mid, blocks, approximate = contents
+        self.alignmentChange(False)
+        # determine the format for the text
+        self.setFormat(f, fmt)
 
         # update the lines for this pane
         pane = self.panes[f]
@@ -1245,20 +1833,16 @@ class FileDiffViewerBase(Gtk.Grid):
         self.replaceLines(f, pane.lines, mid[f], pane.max_line_number, n)
 
         # insert or remove spacer lines from the other panes
-        insertNull, getLine = self.insertNull, self.getLine
         for f_idx in range(len(self.panes)):
             if f_idx != f:
-                for j in range(old_n-1, -1, -1):
-                    if getLine(f_idx, j) is None:
-                        insertNull(f_idx, j, True)
-                temp = mid[f_idx]
-                for j in range(new_n):
-                    if temp[j] is None:
-                        insertNull(f_idx, j, False)
+                self.spliceNulls(f_idx, 0, old_n, _get_layout(mid[f_idx]))
 
         # update the blocks
         self.invalidateLineMatching(0, old_n, new_n)
         self.updateBlocks(blocks)
+        # pane 'f' was aligned with both of its neighbours, the alignment of
+        # the other panes with each other is unchanged
+        self.setApproximateAlignment(approximate, f - 1, f + 1)
         self.alignmentChange(True)
         # update cursor
         self.setLineMode()
@@ -1367,8 +1951,115 @@ class FileDiffViewerBase(Gtk.Grid):
             self.setCurrentLine(f, line0 + max(n_need, 1) - 1, line0)
         else:
             self.setCurrentChar(cur_line, lastcol)
+        if self.prefs.getBool('align_after_edits'):
+            self.realignEdits(line0, n_need + delta)
         self.recordEditMode()
 
+    # returns True if all panes have matching non-blank lines at row 'i'
+    #
+    # These rows are used as stable anchors when realigning after edits.
+    def _isAnchor(self, i: int) -> bool:
+        anchor = None
+        for f in range(len(self.panes)):
+            line = self.getLine(f, i)
+            if line is None:
+                return False
+            s = self._alignmentHash(line)
+            if s is None or is_blank(s):
+                return False
+            if anchor is None:
+                anchor = s
+            elif s != anchor:
+                return False
+        return True
+
+    # realign the rows surrounding the 'n' edited rows starting at row 'i'
+    #
+    # Only the rows between the nearest anchors are realigned so this is
+    # much cheaper than realigning everything.  Block boundaries are treated
+    # as anchors and each block is realigned separately so manual alignment
+    # is kept.  If there is no anchor near the edit, the blocks containing it
+    # are realigned completely.
+    def realignEdits(self, i: int, n: int) -> None:
+        nlines = len(self.panes[0].lines)
+        i = min(i, nlines)
+        i2 = min(i + n, nlines)
+        # find the blocks containing the edited rows
+        start, sizes = self.blocks.getSpan(i, max(i + 1, i2))
+        end = start + sum(sizes)
+
+        # grow the section to the nearest anchors
+        i_min = max(start, i - _REALIGN_EDITS_SEARCH)
+        i2_max = min(end, i2 + _REALIGN_EDITS_SEARCH)
+        while i > i_min and not self._isAnchor(i - 1):
+            i -= 1
+        while i2 < i2_max and not self._isAnchor(i2):
+            i2 += 1
+        if (i > start and not self._isAnchor(i - 1)) or (i2 < end and not self._isAnchor(i2)):
+            # no anchor was found nearby
+            i, i2 = start, end
+
+        # align the lines of the section in each block
+        budget = self._createAlignBudget()
+        old_lines = [pane.lines[i:i2] for pane in self.panes]
+        lines: List[List[Optional[FileDiffViewerBase.Line]]] = [[] for pane in self.panes]
+        block_start = start
+        for k, size in enumerate(sizes):
+            block_end = block_start + size
+            a, b = max(i, block_start) - i, min(i2, block_end) - i
+            block_start = block_end
+            if a >= b:
+                continue
+            aligned: List[List[Optional[FileDiffViewerBase.Line]]] = []
+            newblocks: List[int] = []
+            for temp in old_lines:
+                newlines: List[List[Optional[FileDiffViewerBase.Line]]] = [
+                    [line for line in temp[a:b] if line is not None]]
+                paneblocks = _create_block(len(newlines[0]))
+                if len(aligned) > 0:
+                    self.alignBlocks(newblocks, aligned, paneblocks, newlines, budget)
+                    newblocks = _merge_blocks(newblocks, paneblocks)
+                else:
+                    newblocks = paneblocks
+                aligned.extend(newlines)
+            for pane_lines, block_lines in zip(lines, aligned):
+                pane_lines.extend(block_lines)
+            sizes[k] += len(aligned[0]) - (b - a)
+        if lines == old_lines:
+            # alignment did not change
+            return
+        if budget.exceeded:
+            self.setApproximateAlignment(True)
+
+        # find where the cursor and selection will end up
+        f = self.current_pane
+        new_n = len(lines[0])
+        rows = []
+        for row in self.current_line, self.selection_line:
+            if row >= i2:
+                row += new_n - (i2 - i)
+            elif row >= i:
+                line = old_lines[f][row - i]
+                if line is not None:
+                    row = i + lines[f].index(line)
+                else:
+                    # position after the same number of real lines
+                    k = len([line for line in old_lines[f][:row - i] if line is not None])
+                    row = i
+                    while k > 0:
+                        if lines[f][row - i] is not None:
+                            k -= 1
+                        row += 1
+            rows.append(row)
+
+        # update the lines and the sizes of the blocks containing the section
+        self.updateAlignment(i, i2 - i, lines)
+        self.replaceBlocks(start, end, [size for size in sizes if size > 0])
+        if self.mode == EditMode.CHAR:
+            self.setCurrentChar(rows[0], self.current_char, rows[1], self.selection_char)
+        else:
+            self.setCurrentLine(f, rows[0], rows[1])
+
     # manually adjust line matching so 'line1' of pane 'f' is a neighbour of
     # 'line2' from pane 'f+1'
     def align(self, f, line1, line2):
@@ -1380,20 +2071,8 @@ class FileDiffViewerBase(Gtk.Grid):
         end = line2
         if end < start:
             start, end = end, start
-        pre_blocks = []
-        mid = []
-        post_blocks = []
-        n = 0
-        for b in self.blocks:
-            if n + b <= start:
-                dst = pre_blocks
-            elif n <= end:
-                dst = mid
-            else:
-                dst = post_blocks
-            dst.append(b)
-            n += b
-        start = sum(pre_blocks)
+        # the blocks ending after 'start' and starting at or before 'end'
+        start, mid = self.blocks.getSpan(start, end + 1)
         end = start + sum(mid)
 
         # cut the span of blocks into three sections:
@@ -1438,20 +2117,23 @@ class FileDiffViewerBase(Gtk.Grid):
 
         # align each section and concatenate the results
         finallines = [[] for s in lines]
+        finalblocks = []
+        budget = self._createAlignBudget()
         for b, lines_t in zip(cutblocks, lines_s):
             _remove_null_lines(b[0], lines_t[0])
             _remove_null_lines(b[1], lines_t[1])
-            self.alignBlocks(b[0], lines_t[0], b[1], lines_t[1])
+            self.alignBlocks(b[0], lines_t[0], b[1], lines_t[1], budget)
+            if budget.exceeded:
+                self.setApproximateAlignment(True)
             temp = lines_t[0]
             temp.extend(lines_t[1])
             for dst, s in zip(finallines, temp):
                 dst.extend(s)
-            pre_blocks.extend(_merge_blocks(b[0], b[1]))
-        pre_blocks.extend(post_blocks)
+            finalblocks.extend(_merge_blocks(b[0], b[1]))
 
         # update the actual lines and blocks
         self.updateAlignment(start, end - start, finallines)
-        self.updateBlocks(pre_blocks)
+        self.replaceBlocks(start, end, finalblocks)
 
         i = len(lines_s[0][0][0])
         self.removeSpacerLines(start + i, len(finallines[0]) - i)
@@ -1909,71 +2591,38 @@ class FileDiffViewerBase(Gtk.Grid):
         s2 = utils.null_to_empty(self.getLineText(f + 1, i))
 
         # ignore blank lines if specified
-        if self.prefs.getBool('display_ignore_blanklines') and _is_blank(s1) and _is_blank(s2):
+        normalizer = self.display_normalizer
+        if normalizer.ignore_blanklines and is_blank(s1) and is_blank(s2):
             return result
 
         # ignore white space preferences
-        ignore_whitespace = self.prefs.getBool('display_ignore_whitespace')
-        if ignore_whitespace or self.prefs.getBool('display_ignore_whitespace_changes'):
-            if idx == 0:
-                s = s1
-            else:
-                s = s2
-            if self.prefs.getBool('display_ignore_endofline'):
-                s = utils.strip_eol(s)
-
+        if idx == 0:
+            s = s1
+        else:
+            s = s2
+        # build a mapping from characters in compare string to those in the
+        # original string
+        lookup = normalizer.getOffsets(s)
+        if lookup is not None:
             s1 = utils.null_to_empty(self.getCompareString(f, i))
             s2 = utils.null_to_empty(self.getCompareString(f + 1, i))
 
-            # build a mapping from characters in compare string to those in the
-            # original string
-            v = 0
-            lookup = []
-            # we only need to consider white space here as those are the only
-            # ones that can change the number of characters in the compare
-            # string
-            if ignore_whitespace:
-                # all white space characters were removed
-                for c in s:
-                    if c not in utils.whitespace:
-                        lookup.append(v)
-                    v += 1
-            else:
-                # all white space characters were replaced with a single space
-                first = True
-                for c in s:
-                    if c in utils.whitespace:
-                        # only include the first white space character of a span
-                        if first:
-                            lookup.append(v)
-                            first = False
-                    else:
-                        lookup.append(v)
-                        first = True
-                    v += 1
-            lookup.append(v)
-        else:
-            lookup = None
-
         start = 0
-        for block in difflib.SequenceMatcher(None, s1, s2).get_matching_blocks():
+        for block in inline_diff(s1, s2):
             end = block[idx]
             # skip zero length blocks
             if start < end:
                 if lookup is None:
                     result.append((start, end, flag))
+                elif normalizer.ignore_whitespace:
+                    # map to indices for the original string and skip the
+                    # white space sections
+                    for lookup_start, lookup_end in normalizer.getNonWhitespaceRanges(
+                            s, lookup[start], lookup[end]):
+                        result.append((lookup_start, lookup_end, flag))
                 else:
                     # map to indices for the original string
-                    lookup_start = lookup[start]
-                    lookup_end = lookup[end]
-                    # scan for whitespace and skip those sections if specified
-                    for j in range(lookup_start, lookup_end):
-                        if ignore_whitespace and s[j] in utils.whitespace:
-                            if lookup_start != j:
-                                result.append((lookup_start, j, flag))
-                            lookup_start = j + 1
-                    if lookup_start != lookup_end:
-                        result.append((lookup_start, lookup_end, flag))
+                    result.append((lookup[start], lookup[end], flag))
             start = end + block[2]
         return result
 
@@ -1990,38 +2639,220 @@ class FileDiffViewerBase(Gtk.Grid):
         # compute a new hash and cache it
         s = line.getText()
         if s is not None:
-            if self.prefs.getBool('display_ignore_endofline'):
-                s = utils.strip_eol(s)
-            if self.prefs.getBool('display_ignore_blanklines') and _is_blank(s):
-                return None
-            if self.prefs.getBool('display_ignore_whitespace'):
-                # strip all white space characters
-                for c in utils.whitespace:
-                    s = s.replace(c, '')
-            elif self.prefs.getBool('display_ignore_whitespace_changes'):
-                # map all spans of white space characters to a single space
-                first = True
-                temp = []
-                for c in s:
-                    if c in utils.whitespace:
-                        if first:
-                            temp.append(' ')
-                            first = False
-                    else:
-                        temp.append(c)
-                        first = True
-                s = ''.join(temp)
-            if self.prefs.getBool('display_ignore_case'):
-                # force everything to be upper case
-                s = s.upper()
+            s = self.display_normalizer(s)
             # cache the hash
             line.compare_string = s
         return s
 
+    # store the flags and character difference ranges for line 'i' of pane 'f'
+    def _setDiffCache(self, f: int, i: int, value: Tuple[int, List[Any]]) -> None:
+        diff_cache = self.panes[f].diff_cache
+        # enlarge cache to fit diff_cache[i]
+        if i >= len(diff_cache):
+            diff_cache.extend((i - len(diff_cache) + 1) * [None])
+        diff_cache[i] = value
+
+    # construct a list of ranges for the character differences of line 'i' in
+    # pane 'f' and cache them
+    def _computeDiffCache(self, f: int, i: int) -> None:
+        text = self.getLineText(f, i)
+        flags = 0
+        temp_diff: List[Tuple[int, int, int]] = []
+        comptext = self.getCompareString(f, i)
+        if f > 0:
+            # compare with neighbour to the left
+            if self.getCompareString(f - 1, i) != comptext:
+                flags |= 1
+                if text is not None:
+                    temp_diff = _merge_ranges(temp_diff, self.getDiffRanges(f - 1, i, 1, 1))
+        if f + 1 < len(self.panes):
+            # compare with neighbour to the right
+            if self.getCompareString(f + 1, i) != comptext:
+                flags |= 2
+                if text is not None:
+                    temp_diff = _merge_ranges(temp_diff, self.getDiffRanges(f, i, 0, 2))
+
+        chardiff = []
+        if text is not None and temp_diff:
+            diffcolours = [
+                theResources.getDifferenceColour(f),
+                theResources.getDifferenceColour(f + 1)
+            ]
+            diffcolours.append((diffcolours[0] + diffcolours[1]) * 0.5)
+
+            # expand text into a list of visual representations
+            ss = self.expand(text)
+
+            # find the size of each region in Pango units
+            old_end = 0
+            x_temp = 0
+            for start, end, tflags in temp_diff:
+                x_temp += self.getTextWidth(''.join(ss[old_end:start]))
+                w = self.getTextWidth(''.join(ss[start:end]))
+                chardiff.append((start, end, x_temp, w, diffcolours[tflags - 1]))
+                old_end = end
+                x_temp += w
+        # cache flags and character diff ranges
+        self._setDiffCache(f, i, (flags, chardiff))
+
+    # compute the character differences for the lines near the viewport
+    # during idle time
+    def _scheduleDiffPrefetch(self) -> None:
+        if self._diff_prefetch_id is None:
+            self._diff_prefetch_id = GLib.idle_add(self._prefetchDiffs_cb)
+
+    # fill the character difference caches for the visible lines followed by
+    # a page of lines below and above the viewport
+    #
+    # Each call stops after _DIFF_PREFETCH_SLICE seconds and asks to be called
+    # again until all of the lines have been processed.
+    def _prefetchDiffs_cb(self) -> bool:
+        if not self.get_realized():
+            self._diff_prefetch_id = None
+            return False
+        deadline = time.monotonic() + _DIFF_PREFETCH_SLICE
+        h = self.font_height
+        top = int(self.vadj.get_value()) // h
+        bottom = (int(self.vadj.get_value() + self.vadj.get_page_size()) + h - 1) // h
+        page = bottom - top
+        nlines = len(self.panes[0].lines)
+        sections = [
+            (top, bottom, True),
+            (bottom, bottom + page, False),
+            (top - page, top, False)
+        ]
+        for start, end, visible in sections:
+            for i in range(max(start, 0), min(end, nlines)):
+                for f, pane in enumerate(self.panes):
+                    if i >= len(pane.diff_cache) or pane.diff_cache[i] is None:
+                        self._computeDiffCache(f, i)
+                        if visible:
+                            self._queue_draw_lines(f, i)
+                        if time.monotonic() > deadline:
+                            return True
+        self._diff_prefetch_id = None
+        return False
+
+    # brings the syntax highlighting cache of pane 'f' up to date up to and
+    # including line 'i', returns False if 'deadline' was reached first
+    #
+    # Entries following a change are reused once the state entering a line is
+    # the same as the one its entry was parsed with, so an edit only causes
+    # the lines whose highlighting really changed to be parsed again.
+    def _updateSyntaxCache(self, f, i, syntax, deadline=None):
+        pane = self.panes[f]
+        cache = pane.syntax_cache
+        n = pane.syntax_valid
+        if n > i:
+            return True
+        if n == 0:
+            state = None if syntax is None else syntax.initial_state
+        else:
+            state = cache[n - 1][1]
+        ncache = len(cache)
+        while n <= i:
+            if n < ncache:
+                item = cache[n]
+                if item is not None and item[0] == state:
+                    # the line and the state entering it are unchanged
+                    state = item[1]
+                    n += 1
+                    continue
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            temp = self.getLineText(f, n)
+            if syntax is None:
+                end_state = None
+                if temp is None:
+                    blocks = None
+                else:
+                    blocks = [(0, len(temp), 'text')]
+            elif temp is None:
+                end_state, blocks = state, None
+            else:
+                # apply the syntax highlighting rules to identify ranges of
+                # similarly coloured characters
+                end_state, blocks = syntax.parse(state, temp)
+            item = [state, end_state, blocks, None]
+            if n < ncache:
+                cache[n] = item
+            else:
+                cache.append(item)
+                ncache += 1
+            state = end_state
+            n += 1
+        pane.syntax_valid = n
+        return n > i
+
+    # queue an idle callback to fill the syntax highlighting caches
+    def _scheduleSyntaxHighlighting(self) -> None:
+        if self._syntax_highlight_id is None:
+            self._syntax_highlight_id = GLib.idle_add(self._highlightSyntax_cb)
+
+    # fill the syntax highlighting caches up to the last visible line of every
+    # pane and then a page of lines further
+    #
+    # Each call stops after _SYNTAX_SLICE seconds and asks to be called again
+    # until all of the lines have been processed.  Panes are redrawn once their
+    # visible lines are ready as they may have been drawn without highlighting.
+    def _highlightSyntax_cb(self) -> bool:
+        if not self.get_realized():
+            self._syntax_highlight_id = None
+            return False
+        deadline = time.monotonic() + _SYNTAX_SLICE
+        syntax = theResources.getSyntax(self.syntax)
+        h = self.font_height
+        top = int(self.vadj.get_value()) // h
+        bottom = (int(self.vadj.get_value() + self.vadj.get_page_size()) + h - 1) // h
+        for end, visible in (bottom, True), (2 * bottom - top, False):
+            for f, pane in enumerate(self.panes):
+                last = min(end, len(pane.lines)) - 1
+                if pane.syntax_valid <= last:
+                    if not self._updateSyntaxCache(f, last, syntax, deadline):
+                        return True
+                    if visible:
+                        self.dareas[f].queue_draw()
+        self._syntax_highlight_id = None
+        return False
+
     # draw the text viewport
     def darea_draw_cb(self, widget, cr, f):
+        self.scrolledwindows[f].paint(cr, lambda buffer_cr: self._paintPane(widget, buffer_cr, f))
+
+    # returns a repeating pattern used to draw the hatching of spacing lines
+    # aligned with lines starting at 'x_start'
+    #
+    # A tile is rendered once for the current font height and hatch colour.
+    def _getHatchPattern(self, cr, x_start):
+        h = self.font_height
+        colour = theResources.getColour('hatch')
+        key = (h, colour.red, colour.green, colour.blue)
+        if self._hatch_pattern is None or self._hatch_pattern[0] != key:
+            # the hatching is made of diagonal lines repeating every h / 2
+            # pixels, draw enough of them to cover a h x h tile
+            tile = cr.get_target().create_similar(cairo.Content.COLOR_ALPHA, h, h)
+            tile_cr = cairo.Context(tile)
+            tile_cr.set_source_rgb(colour.red, colour.green, colour.blue)
+            tile_cr.set_line_width(1)
+            h_half = 0.5 * h
+            for j in range(-4, 4):
+                tile_cr.move_to(j * h_half, 0)
+                tile_cr.rel_line_to(h, h)
+                tile_cr.move_to(j * h_half, h)
+                tile_cr.rel_line_to(h, -h)
+            tile_cr.stroke()
+            pattern = cairo.SurfacePattern(tile)
+            pattern.set_extend(cairo.Extend.REPEAT)
+            self._hatch_pattern = (key, pattern)
+        pattern = self._hatch_pattern[1]
+        pattern.set_matrix(cairo.Matrix(x0=-x_start))
+        return pattern
+
+    # paint the region of pane 'f' selected by the clip region of 'cr'
+    def _paintPane(self, widget, cr, f):
         pane = self.panes[f]
         syntax = theResources.getSyntax(self.syntax)
+        syntax_deadline = time.monotonic() + _SYNTAX_SLICE
 
         rect = widget.get_allocation()
         x = rect.x + int(self.hadj.get_value())
@@ -2030,7 +2861,10 @@ class FileDiffViewerBase(Gtk.Grid):
         cr.translate(-x, -y)
 
         maxx = x + rect.width
-        maxy = y + rect.height
+        # only paint the lines intersecting the clip region
+        clip_y1, clip_y2 = cr.clip_extents()[1::2]
+        maxy = min(y + rect.height, int(clip_y2) + 1)
+        y = max(y, int(clip_y1))
         line_number_width = _pixels(self.getLineNumberWidth())
         h = self.font_height
 
@@ -2059,9 +2893,8 @@ class FileDiffViewerBase(Gtk.Grid):
                 if line is not None and line.line_number is not None:
                     colour = theResources.getColour('line_number')
                     cr.set_source_rgb(colour.red, colour.green, colour.blue)
-                    layout = self.create_pango_layout(str(line.line_number))
-                    layout.set_font_description(self.font)
-                    w = _pixels(layout.get_size()[0] + self.digit_width)
+                    layout, w = theLayoutCache.get(self, self.font, str(line.line_number))
+                    w = _pixels(w + self.digit_width)
                     cr.move_to(line_number_width - w, y_start)
                     PangoCairo.show_layout(cr, layout)
                 cr.restore()
@@ -2075,52 +2908,17 @@ class FileDiffViewerBase(Gtk.Grid):
                 text = self.getLineText(f, i)
                 ss = None
 
-                # enlarge cache to fit pan.diff_cache[i]
-                if i >= len(pane.diff_cache):
-                    pane.diff_cache.extend((i - len(pane.diff_cache) + 1) * [None])
-                # construct a list of ranges for this lines character
-                # differences if not already cached
-                if pane.diff_cache[i] is None:
-                    flags = 0
-                    temp_diff = []
-                    comptext = self.getCompareString(f, i)
-                    if f > 0:
-                        # compare with neighbour to the left
-                        if self.getCompareString(f - 1, i) != comptext:
-                            flags |= 1
-                            if text is not None:
-                                temp_diff = _merge_ranges(
-                                    temp_diff,
-                                    self.getDiffRanges(f - 1, i, 1, 1))
-                    if f + 1 < len(self.panes):
-                        # compare with neighbour to the right
-                        if self.getCompareString(f + 1, i) != comptext:
-                            flags |= 2
-                            if text is not None:
-                                temp_diff = _merge_ranges(temp_diff, self.getDiffRanges(f, i, 0, 2))
-
-                    chardiff = []
-                    if text is not None:
-                        # expand text into a list of visual representations
-                        ss = self.expand(text)
-
-                        # find the size of each region in Pango units
-                        old_end = 0
-                        x_temp = 0
-                        for start, end, tflags in temp_diff:
-                            layout = self.create_pango_layout(''.join(ss[old_end:start]))
-                            layout.set_font_description(self.font)
-                            x_temp += layout.get_size()[0]
-                            layout = self.create_pango_layout(''.join(ss[start:end]))
-                            layout.set_font_description(self.font)
-                            w = layout.get_size()[0]
-                            chardiff.append((start, end, x_temp, w, diffcolours[tflags - 1]))
-                            old_end = end
-                            x_temp += w
-                    # cache flags and character diff ranges
-                    pane.diff_cache[i] = (flags, chardiff)
-                else:
+                # character differences are computed by the prefetcher so
+                # only the line differences are shown until they are ready
+                if i < len(pane.diff_cache) and pane.diff_cache[i] is not None:
                     flags, chardiff = pane.diff_cache[i]
+                else:
+                    flags, chardiff = self.getMapFlags(f, i) & 3, []
+                    if flags == 0:
+                        # nothing to compute
+                        self._setDiffCache(f, i, (flags, chardiff))
+                    else:
+                        self._scheduleDiffPrefetch()
 
                 # account for preedit changes
                 if f > 0 and self.hasPreedit(f - 1, i):
@@ -2204,12 +3002,8 @@ class FileDiffViewerBase(Gtk.Grid):
                             if start_char < end_char:
                                 if ss is None:
                                     ss = self.expand(text)
-                                layout = self.create_pango_layout(''.join(ss[:start_char]))
-                                layout.set_font_description(self.font)
-                                x_temp = layout.get_size()[0]
-                                layout = self.create_pango_layout(''.join(ss[start_char:end_char]))
-                                layout.set_font_description(self.font)
-                                w = layout.get_size()[0]
+                                x_temp = self.getTextWidth(''.join(ss[:start_char]))
+                                w = self.getTextWidth(''.join(ss[start_char:end_char]))
                                 colour = theResources.getColour('character_selection')
                                 alpha = theResources.getFloat('character_selection_opacity')
                                 cr.set_source_rgba(colour.red, colour.green, colour.blue, alpha)
@@ -2231,58 +3025,26 @@ class FileDiffViewerBase(Gtk.Grid):
 
                 if text is None:
                     # draw hatching
-                    colour = theResources.getColour('hatch')
-                    cr.set_source_rgb(colour.red, colour.green, colour.blue)
-                    cr.set_line_width(1)
-                    h2 = 2 * h
-                    temp = line_number_width
-                    if temp < x:
-                        temp += ((x - temp) // h) * h
-                    h_half = 0.5 * h
-                    phase = [h_half, h_half, -h_half, -h_half]
-                    for j in range(4):
-                        x_temp = temp
-                        y_temp = y_start
-                        for k in range(j):
-                            y_temp += phase[k]
-                        cr.move_to(x_temp, y_temp)
-                        for k in range(j, 4):
-                            cr.rel_line_to(h_half, phase[k])
-                            x_temp += h_half
-                        while x_temp < maxx:
-                            cr.rel_line_to(h, h)
-                            cr.rel_line_to(h, -h)
-                            x_temp += h2
-                        cr.stroke()
+                    cr.set_source(self._getHatchPattern(cr, line_number_width))
+                    cr.rectangle(x_start, y_start, maxx - x_start, h)
+                    cr.fill()
                 else:
-                    # continue populating the syntax highlighting cache until
+                    # bring the syntax highlighting cache up to date until
                     # line 'i' is included
-                    n = len(pane.syntax_cache)
-                    while i >= n:
-                        temp = self.getLineText(f, n)
-                        if syntax is None:
-                            initial_state, end_state = None, None
-                            if temp is None:
-                                blocks = None
-                            else:
-                                blocks = [(0, len(temp), 'text')]
-                        else:
-                            # apply the syntax highlighting rules to identify
-                            # ranges of similarly coloured characters
-                            if n == 0:
-                                initial_state = syntax.initial_state
-                            else:
-                                initial_state = pane.syntax_cache[-1][1]
-                            if temp is None:
-                                end_state, blocks = initial_state, None
-                            else:
-                                end_state, blocks = syntax.parse(initial_state, temp)
-                        pane.syntax_cache.append([initial_state, end_state, blocks, None])
-                        n += 1
-
-                    # use the cache the position, layout, and colour of each
-                    # span of characters
-                    blocks = pane.syntax_cache[i][3]
+                    if not self._updateSyntaxCache(f, i, syntax, syntax_deadline):
+                        # draw the line with the default colour until the idle
+                        # callback has caught up
+                        if ss is None:
+                            ss = self.expand(text)
+                        layout = theLayoutCache.getLayout(self, self.font, ''.join(ss))
+                        colour = theResources.getColour(
+                            'text' if syntax is None else syntax.default_token_type)
+                        blocks = [(0, len(ss), 0, layout, colour)]
+                        self._scheduleSyntaxHighlighting()
+                    else:
+                        # use the cache the position, layout, and colour of
+                        # each span of characters
+                        blocks = pane.syntax_cache[i][3]
                     if blocks is None:
                         # populate the cache item if it didn't exist
                         if ss is None:
@@ -2290,11 +3052,10 @@ class FileDiffViewerBase(Gtk.Grid):
                         x_temp = 0
                         blocks = []
                         for start, end, tag in pane.syntax_cache[i][2]:
-                            layout = self.create_pango_layout(''.join(ss[start:end]))
-                            layout.set_font_description(self.font)
+                            layout, w = theLayoutCache.get(self, self.font, ''.join(ss[start:end]))
                             colour = theResources.getColour(tag)
                             blocks.append((start, end, x_temp, layout, colour))
-                            x_temp += layout.get_size()[0]
+                            x_temp += w
                         pane.syntax_cache[i][3] = blocks
 
                     # draw text
@@ -2307,15 +3068,13 @@ class FileDiffViewerBase(Gtk.Grid):
                             elif self.current_char < endi:
                                 # divide text into 2 segments
                                 ss = self.expand(text)
-                                layout = self.create_pango_layout(
-                                    ''.join(ss[starti:self.current_char]))
-                                layout.set_font_description(self.font)
+                                layout, w = theLayoutCache.get(
+                                    self, self.font, ''.join(ss[starti:self.current_char]))
                                 cr.move_to(x_start + _pixels(start), y_start)
                                 PangoCairo.show_layout(cr, layout)
-                                start += layout.get_size()[0] + preeditwidth
-                                layout = self.create_pango_layout(
-                                    ''.join(ss[self.current_char:endi]))
-                                layout.set_font_description(self.font)
+                                start += w + preeditwidth
+                                layout = theLayoutCache.getLayout(
+                                    self, self.font, ''.join(ss[self.current_char:endi]))
                         cr.move_to(x_start + _pixels(start), y_start)
                         PangoCairo.show_layout(cr, layout)
 
@@ -2370,6 +3129,8 @@ class FileDiffViewerBase(Gtk.Grid):
     def vadj_changed_cb(self, adj):
         self._cursor_position_changed(False)
         self.diffmap.queue_draw()
+        self._scheduleDiffPrefetch()
+        self._scheduleSyntaxHighlighting()
 
     # callback to handle button presses on the overview map
     def diffmap_button_press_cb(self, widget, event):
@@ -2398,99 +3159,27 @@ class FileDiffViewerBase(Gtk.Grid):
         n = len(self.panes)
 
         # compute map if it hasn't already been cached
-        # the map is a list of (start, end, flags) tuples for each pane
-        # flags & 1 indicates differences with the pane to the left
-        # flags & 2 indicates differences with the pane to the right
-        # flags & 4 indicates modified lines
-        # flags & 8 indicates regular lines with text
-        if self.diffmap_cache is None:
-            nlines = len(self.panes[0].lines)
-            start = n * [0]
-            flags = n * [0]
-            self.diffmap_cache = [[] for f in range(n)]
-            # iterate over each row of lines
-            for i in range(nlines):
-                nextflag = 0
-                # iterate over each pane
-                for f in range(n):
-                    flag = nextflag
-                    nextflag = 0
-                    s0 = self.getCompareString(f, i)
-                    # compare with neighbour to the right
-                    if f + 1 < n:
-                        if s0 != self.getCompareString(f + 1, i):
-                            flag |= 2
-                            nextflag |= 1
-                    line = self.getLine(f, i)
-                    if line is not None and line.is_modified:
-                        # modified line
-                        flag = 4
-                    elif line is None or line.getText() is None:
-                        # empty line
-                        flag = 0
-                    elif flag == 0:
-                        # regular line
-                        flag = 8
-                    if flags[f] != flag:
-                        if flags[f] != 0:
-                            self.diffmap_cache[f].append([start[f], i, flags[f]])
-                        start[f] = i
-                        flags[f] = flag
-            # finish any incomplete ranges
-            for f in range(n):
-                if flags[f] != 0:
-                    self.diffmap_cache[f].append([start[f], nlines, flags[f]])
-
-        # clear
-        colour = theResources.getColour('map_background')
-        cr.set_source_rgb(colour.red, colour.green, colour.blue)
-        cr.paint()
-        bg_colour = theResources.getColour('text_background')
-        edited_colour = theResources.getColour('edited')
+        nlines = len(self.panes[0].lines)
+        if self.diffmap_flags is None or len(self.diffmap_flags[0]) != nlines:
+            self.diffmap_flags = [array('B', bytes(nlines)) for f in range(n)]
+            self._updateDiffmapRows(0, nlines)
 
         rect = widget.get_allocation()
 
         # get scroll position and total size
         vadj = self.vadj
-        hmax = max(vadj.get_upper(), rect.height)
-
-        # draw diff blocks
-        wn = rect.width / n
-        pad = 1
-        for f in range(n):
-            diffcolours = [
-                theResources.getDifferenceColour(f),
-                theResources.getDifferenceColour(f + 1)
-            ]
-            diffcolours.append((diffcolours[0] + diffcolours[1]) * 0.5)
-            wx = f * wn
-            # draw in two passes, more important stuff in the second pass
-            # this ensures less important stuff does not obscure more important
-            # data
-            for p in range(2):
-                for start, end, flag in self.diffmap_cache[f]:
-                    if p == 0 and flag == 8:
-                        colour = bg_colour
-                    elif p == 1 and flag & 7:
-                        if flag & 4:
-                            colour = edited_colour
-                        else:
-                            colour = diffcolours[(flag & 3) - 1]
-                    else:
-                        continue
-
-                    # ensure the line is visible in the map
-                    ymin = rect.height * self.font_height * start // hmax
-                    if ymin >= rect.y + rect.height:
-                        break
-                    yh = max(rect.height * self.font_height * end // hmax - ymin, 1)
-
-                    # if ymin + yh <= rect.y:
-                    #     continue
-
-                    cr.set_source_rgb(colour.red, colour.green, colour.blue)
-                    cr.rectangle(wx + pad, ymin, wn - 2 * pad, yh)
-                    cr.fill()
+        hmax = int(max(vadj.get_upper(), rect.height))
+
+        # the map is only redrawn when it changes or is resized, scrolling
+        # just moves the cursor drawn over it
+        key = (rect.width, rect.height, hmax, self.font_height)
+        if self.diffmap_surface is None or self.diffmap_surface[0] != key:
+            surface = cr.get_target().create_similar(
+                cairo.Content.COLOR, rect.width, rect.height)
+            self._paintDiffmap(cairo.Context(surface), rect, hmax)
+            self.diffmap_surface = (key, surface)
+        cr.set_source_surface(self.diffmap_surface[1], 0, 0)
+        cr.paint()
 
         # draw cursor
         vmin = int(vadj.get_value())
@@ -2513,6 +3202,49 @@ class FileDiffViewerBase(Gtk.Grid):
             cr.rectangle(0.5, ymin + 0.5, rect.width - 1, yh - 1)
             cr.stroke()
 
+    # draw the overview map
+    #
+    # The rows of each pane are binned into pixel rows keeping the most
+    # important flag so at most one rectangle is filled for each run of equal
+    # pixel rows.
+    def _paintDiffmap(self, cr, rect, hmax):
+        n = len(self.panes)
+        # clear
+        colour = theResources.getColour('map_background')
+        cr.set_source_rgb(colour.red, colour.green, colour.blue)
+        cr.paint()
+        bg_colour = theResources.getColour('text_background')
+        edited_colour = theResources.getColour('edited')
+
+        # draw diff blocks
+        wn = rect.width / n
+        pad = 1
+        for f in range(n):
+            diffcolours = [
+                theResources.getDifferenceColour(f),
+                theResources.getDifferenceColour(f + 1)
+            ]
+            diffcolours.append((diffcolours[0] + diffcolours[1]) * 0.5)
+            wx = f * wn
+            pixels = _bin_diffmap_flags(
+                self.diffmap_flags[f].tobytes(),
+                rect.height,
+                rect.height * self.font_height,
+                hmax)
+            for m in _DIFFMAP_RUN.finditer(pixels):
+                flag = m.group()[0]
+                if flag == 0:
+                    continue
+                if flag == 8:
+                    colour = bg_colour
+                elif flag & 4:
+                    colour = edited_colour
+                else:
+                    colour = diffcolours[(flag & 3) - 1]
+                cr.set_source_rgb(colour.red, colour.green, colour.blue)
+                cr.rectangle(wx + pad, m.start(), wn - 2 * pad, m.end() - m.start())
+                cr.fill()
+
     # returns the maximum valid offset for a cursor position
     # cursors cannot be moved to the right of line ending characters
     def getMaxCharPosition(self, i):
@@ -2647,7 +3379,7 @@ class FileDiffViewerBase(Gtk.Grid):
                 self._queue_draw_lines(f - 1, i)
             if f + 1 < len(self.panes):
                 self._queue_draw_lines(f + 1, i)
-        self.updateSize(False)
+        self.updateSize()
 
     # queue a redraw for location of preedit text
     def im_preedit_changed_cb(self, im):
@@ -3092,8 +3824,16 @@ class FileDiffViewerBase(Gtk.Grid):
     # recompute viewport size and redraw as the display preferences may have
     # changed
     def prefsUpdated(self) -> None:
-        # clear cache as tab width may have changed
-        self.string_width_cache = {}
+        self._updateNormalizers()
+        self.generation += 1
+        # clear caches as the tab width and comparison preferences may have
+        # changed
+        self.string_width_cache.clear()
+        for pane in self.panes:
+            for line in pane.lines:
+                if line is not None:
+                    line.compare_string = None
+            self._computeLineWidths(pane)
         self.setFont(
             Pango.FontDescription.from_string(self.prefs.getString('display_font')))
         # update preedit text
@@ -3105,8 +3845,7 @@ class FileDiffViewerBase(Gtk.Grid):
         self.emit('cursor-changed')
         for darea in self.dareas:
             darea.queue_draw()
-        self.diffmap_cache = None
-        self.diffmap.queue_draw()
+        self._invalidateDiffmap()
 
     # 'realign-all' action
     def realign_all(self) -> None:
@@ -3128,6 +3867,8 @@ class FileDiffViewerBase(Gtk.Grid):
             lines.extend(newlines)
         self.updateAlignment(0, len(self.panes[f].lines), lines)
         self.updateBlocks(blocks)
+        # no budget was used so the alignment is now exact
+        self.setApproximateAlignment(False)
         self.setCurrentLine(f, min(self.current_line, len(self.panes[f].lines)))
         self.recordEditMode()
 
@@ -3164,8 +3905,7 @@ class FileDiffViewerBase(Gtk.Grid):
             space = [n * [None] for pane in self.panes]
             lines[f], space[f] = space[f], lines[f]
 
-            pre, post = _cut_blocks(end, self.blocks)
-            pre, middle = _cut_blocks(start, pre)
+            middle = self.blocks.getCut(start, end)
 
             # remove nulls
             b = _create_block(n)
@@ -3180,10 +3920,7 @@ class FileDiffViewerBase(Gtk.Grid):
 
             # update lines and blocks
             self.updateAlignment(start, n, space)
-            pre.extend(b)
-            pre.extend(middle)
-            pre.extend(post)
-            self.updateBlocks(pre)
+            self.replaceBlocks(start, start + n, b + middle)
             self.removeSpacerLines(end, sum(middle))
             end -= self.removeSpacerLines(start, sum(b))
             self.setCurrentLine(f, end, start)
@@ -3296,8 +4033,7 @@ class FileDiffViewerBase(Gtk.Grid):
                     del self.panes[f].diff_cache[:]
                     self.dareas[f].queue_draw()
         # queue redraw
-        self.diffmap_cache = None
-        self.diffmap.queue_draw()
+        self._invalidateDiffmap()
         self.emit('swapped-panes', f_dst, f_src)
 
     # swap the contents of two panes
@@ -3307,6 +4043,11 @@ class FileDiffViewerBase(Gtk.Grid):
                 self.setLineMode()
             self.recordEditMode()
             self.swapPanes(f_dst, f_src)
+            if self.approximate_alignment:
+                # the swapped panes have new neighbours that may not have
+                # been aligned exactly
+                for f in f_dst, f_src:
+                    self.setApproximateAlignment(True, f - 1, f + 1)
             self.recordEditMode()
 
     # callback for swap panes menu item
@@ -3669,8 +4410,7 @@ class FileDiffViewerBase(Gtk.Grid):
             if right_first:
                 lines, spaces = spaces, lines
 
-            pre, post = _cut_blocks(end, self.blocks)
-            pre, b = _cut_blocks(start, pre)
+            b = self.blocks.getCut(start, end)
 
             #  join and remove null lines
             b.extend(b)
@@ -3701,9 +4441,7 @@ class FileDiffViewerBase(Gtk.Grid):
 
             # update lines and blocks
             self.updateAlignment(start, n, lines)
-            pre.extend(b)
-            pre.extend(post)
-            self.updateBlocks(pre)
+            self.replaceBlocks(start, start + n, b)
 
             for i in range(new_n):
                 s = None
@@ -3744,215 +4482,13 @@ def _get_character_class(c: str) -> CharacterClass:
     return CharacterClass.OTHER
 
 
-# patience diff with difflib-style fallback
-def _patience_diff(a, b):
-    matches, len_a, len_b = [], len(a), len(b)
-    if len_a and len_b:
-        blocks = [(0, len_a, 0, len_b, 0)]
-        while blocks:
-            start_a, end_a, start_b, end_b, match_idx = blocks.pop()
-            aa, bb = a[start_a:end_a], b[start_b:end_b]
-            # try patience
-            pivots = _patience_subsequence(aa, bb)
-            if pivots:
-                offset_a, offset_b = start_a, start_b
-                for pivot_a, pivot_b in pivots:
-                    pivot_a += offset_a
-                    pivot_b += offset_b
-                    if start_a <= pivot_a:
-                        # extend before
-                        idx_a, idx_b = pivot_a, pivot_b
-                        while start_a < idx_a and start_b < idx_b and a[idx_a - 1] == b[idx_b - 1]:
-                            idx_a -= 1
-                            idx_b -= 1
-                        # if anything is before recurse on the section
-                        if start_a < idx_a and start_b < idx_b:
-                            blocks.append((start_a, idx_a, start_b, idx_b, match_idx))
-                        # extend after
-                        start_a, start_b = pivot_a + 1, pivot_b + 1
-                        while start_a < end_a and start_b < end_b and a[start_a] == b[start_b]:
-                            start_a += 1
-                            start_b += 1
-                        # record match
-                        matches.insert(match_idx, (idx_a, idx_b, start_a - idx_a))
-                        match_idx += 1
-                # if anything is after recurse on the section
-                if start_a < end_a and start_b < end_b:
-                    blocks.append((start_a, end_a, start_b, end_b, match_idx))
-            else:
-                # fallback if patience fails
-                pivots = _lcs_approx(aa, bb)
-                if pivots:
-                    idx_a, idx_b, n = pivots
-                    idx_a += start_a
-                    idx_b += start_b
-                    # if anything is before recurse on the section
-                    if start_a < idx_a and start_b < idx_b:
-                        blocks.append((start_a, idx_a, start_b, idx_b, match_idx))
-                    # record match
-                    matches.insert(match_idx, (idx_a, idx_b, n))
-                    match_idx += 1
-                    idx_a += n
-                    idx_b += n
-                    # if anything is after recurse on the section
-                    if idx_a < end_a and idx_b < end_b:
-                        blocks.append((idx_a, end_a, idx_b, end_b, match_idx))
-    # try matching from beginning to first match block
-    if matches:
-        end_a, end_b = matches[0][:2]
-    else:
-        end_a, end_b = len_a, len_b
-    i = 0
-    while i < end_a and i < end_b and a[i] == b[i]:
-        i += 1
-    if i:
-        matches.insert(0, (0, 0, i))
-    # try matching from last match block to end
-    if matches:
-        start_a, start_b, n = matches[-1]
-        start_a += n
-        start_b += n
-    else:
-        start_a, start_b = 0, 0
-    end_a, end_b = len_a, len_b
-    while start_a < end_a and start_b < end_b and a[end_a - 1] == b[end_b - 1]:
-        end_a -= 1
-        end_b -= 1
-    if end_a < len_a:
-        matches.append((end_a, end_b, len_a - end_a))
-    # add a zero length block to the end
-    matches.append((len_a, len_b, 0))
-    return matches
-
-
-# longest common subsequence of unique elements common to 'a' and 'b'
-def _patience_subsequence(a, b):
-    # value unique lines by their order in each list
-    value_a, value_b = {}, {}
-    # find unique values in 'a'
-    for i, s in enumerate(a):
-        if s in value_a:
-            value_a[s] = -1
-        else:
-            value_a[s] = i
-    # find unique values in 'b'
-    for i, s in enumerate(b):
-        if s in value_b:
-            value_b[s] = -1
-        else:
-            value_b[s] = i
-    # lay down items in 'b' as if playing patience if the item is unique in
-    # 'a' and 'b'
-    pile, pointers, atob = [], {}, {}
-    get, append = value_a.get, pile.append
-    for s in b:
-        v = get(s, -1)
-        if v != -1:
-            vb = value_b[s]
-            if vb != -1:
-                atob[v] = vb
-                # find appropriate pile for v
-                start, end = 0, len(pile)
-                # optimisation as values usually increase
-                if end and v > pile[-1]:
-                    start = end
-                else:
-                    while start < end:
-                        mid = (start + end) // 2
-                        if v < pile[mid]:
-                            end = mid
-                        else:
-                            start = mid + 1
-                if start < len(pile):
-                    pile[start] = v
-                else:
-                    append(v)
-                if start:
-                    pointers[v] = pile[start-1]
-    # examine our piles to determine the longest common subsequence
-    result = []
-    if pile:
-        v, append = pile[-1], result.append
-        append((v, atob[v]))
-        while v in pointers:
-            v = pointers[v]
-            append((v, atob[v]))
-        result.reverse()
-    return result
-
-
-# difflib-style approximation of the longest common subsequence
-def _lcs_approx(a, b):
-    count1, lookup = {}, {}
-    # count occurrences of each element in 'a'
-    for s in a:
-        count1[s] = count1.get(s, 0) + 1
-    # construct a mapping from a element to where it can be found in 'b'
-    for i, s in enumerate(b):
-        if s in lookup:
-            lookup[s].append(i)
-        else:
-            lookup[s] = [i]
-    if set(lookup).intersection(count1):
-        # we have some common elements
-        # identify popular entries
-        popular = {}
-        n = len(a)
-        if n > 200:
-            for k, v in count1.items():
-                if 100 * v > n:
-                    popular[k] = 1
-        n = len(b)
-        if n > 200:
-            for k, v in lookup.items():
-                if 100 * len(v) > n:
-                    popular[k] = 1
-        # while walk through entries in 'a', incrementally update the list of
-        # matching subsequences in 'b' and keep track of the longest match
-        # found
-        prev_matches, matches, max_length, max_indices = {}, {}, 0, []
-        for ai, s in enumerate(a):
-            if s in lookup:
-                if s in popular:
-                    # we only extend existing previously found matches to avoid
-                    # performance issues
-                    for bi, bv in prev_matches.items():
-                        if bi + 1 < n and b[bi + 1] == s:
-                            matches[bi] = v = bv + 1
-                            # check if this is now the longest match
-                            if v >= max_length:
-                                if v == max_length:
-                                    max_indices.append((ai, bi))
-                                else:
-                                    max_length = v
-                                    max_indices = [(ai, bi)]
-                else:
-                    prev_get = prev_matches.get
-                    for bi in lookup[s]:
-                        matches[bi] = v = prev_get(bi - 1, 0) + 1
-                        # check if this is now the longest match
-                        if v >= max_length:
-                            if v == max_length:
-                                max_indices.append((ai, bi))
-                            else:
-                                max_length = v
-                                max_indices = [(ai, bi)]
-            prev_matches, matches = matches, {}
-        if max_indices:
-            # include any popular entries at the beginning
-            aidx, bidx, nidx = 0, 0, 0
-            for ai, bi in max_indices:
-                n = max_length
-                ai += 1 - n
-                bi += 1 - n
-                while ai and bi and a[ai - 1] == b[bi - 1]:
-                    ai -= 1
-                    bi -= 1
-                    n += 1
-                if n > nidx:
-                    aidx, bidx, nidx = ai, bi, n
-            return aidx, bidx, nidx
-    return None
+# map equal hashes in 'a' and 'b' to the same integer ID
+def _intern_hashes(a, b):
+    ids: Dict[Any, int] = {}
+    setdefault = ids.setdefault
+    ia = [setdefault(s, len(ids)) for s in a]
+    ib = [setdefault(s, len(ids)) for s in b]
+    return ia, ib
 
 
 # True if the string ends with '\r\n'
@@ -4021,37 +4557,60 @@ def _create_block(n: int) -> List[int]:
     return []
 
 
+# returns the overview map 'flags' of a pane binned into 'height' pixel rows,
+# row i of the map starts at pixel row i * num // den and each pixel row keeps
+# the most important flag drawn there
+def _bin_diffmap_flags(flags: bytes, height: int, num: int, den: int) -> bytes:
+    priorities = flags.translate(_DIFFMAP_PRIORITY)
+    n = len(priorities)
+    pixels = bytearray(height)
+    i = 0
+    for y in range(height):
+        # rows starting in this pixel row
+        end = min(-(-(y + 1) * den // num), n)
+        if i < end:
+            pixels[y] = max(priorities[i:end])
+            i = end
+        elif i < n or y < n * num // den:
+            # the previous row extends over this pixel row
+            pixels[y] = priorities[i - 1]
+        else:
+            break
+    return bytes(pixels).translate(_DIFFMAP_FLAGS)
+
+
 # returns the two sets of blocks after cutting at 'i'
 def _cut_blocks(i: int, blocks: List[int]) -> Tuple[List[int], List[int]]:
-    pre, post, nlines = [], [], 0
-    for b in blocks:
-        if nlines >= i:
-            post.append(b)
-        elif nlines + b <= i:
-            pre.append(b)
-        else:
-            n = i - nlines
-            pre.append(n)
-            post.append(b - n)
-        nlines += b
+    k, start = 0, 0
+    while k < len(blocks) and start + blocks[k] <= i:
+        start += blocks[k]
+        k += 1
+    pre, post = blocks[:k], blocks[k:]
+    if start < i and k < len(blocks):
+        # split the block containing 'i'
+        pre.append(i - start)
+        post[0] -= i - start
     return pre, post
 
 
-# returns a set of blocks containing all of the cuts in the inputs
+# returns a set of blocks containing all of the cuts in the inputs, both sets
+# of blocks must contain the same number of lines
 def _merge_blocks(leftblocks: List[int], rightblocks: List[int]) -> List[int]:
-    leftblocks, rightblocks, b = leftblocks[:], rightblocks[:], []
-    while len(leftblocks) > 0:
-        nleft, nright = leftblocks[0], rightblocks[0]
+    b: List[int] = []
+    li, ri, nleft, nright = 0, 0, 0, 0
+    while True:
+        if nleft == 0:
+            if li == len(leftblocks):
+                break
+            nleft = leftblocks[li]
+            li += 1
+        if nright == 0:
+            nright = rightblocks[ri]
+            ri += 1
         n = min(nleft, nright)
-        if n < nleft:
-            leftblocks[0] -= n
-        else:
-            del leftblocks[0]
-        if n < nright:
-            rightblocks[0] -= n
-        else:
-            del rightblocks[0]
         b.append(n)
+        nleft -= n
+        nright -= n
     return b
 
 
@@ -4091,31 +4650,41 @@ def _merge_ranges(r1, r2):
     return result
 
 
-# eliminates lines that are spacing lines in all panes
-def _remove_null_lines(blocks, lines_set):
-    bi, bn, i = 0, 0, 0
-    while bi < len(blocks):
-        while i < bn + blocks[bi]:
-            for lines in lines_set:
-                if lines[i] is not None:
-                    i += 1
-                    break
-            else:
-                for lines in lines_set:
-                    del lines[i]
-                blocks[bi] -= 1
-        if blocks[bi] == 0:
-            del blocks[bi]
-        else:
-            bn += blocks[bi]
-            bi += 1
+# returns the layout of 'rows' used by FileDiffViewerBase.spliceNulls(), each
+# byte is 1 for a line and 0 for a spacing line
+def _get_layout(rows: List[Any]) -> bytes:
+    return bytes([line is not None for line in rows])
+
+
+# returns a copy of 'lines' with spacing lines inserted so they are located at
+# the rows listed in 'rows'
+def _insert_nulls(lines: List[Any], rows: List[int]) -> List[Any]:
+    result: List[Any] = []
+    start = 0
+    for n, i in enumerate(rows):
+        # 'n' spacing lines have already been inserted before row 'i'
+        end = i - n
+        result.extend(lines[start:end])
+        result.append(None)
+        start = end
+    result.extend(lines[start:])
+    return result
 
 
-# returns true if the string only contains whitespace characters
-def _is_blank(s: str) -> bool:
-    for c in utils.whitespace:
-        s = s.replace(c, '')
-    return len(s) == 0
+# eliminates lines that are spacing lines in all panes
+def _remove_null_lines(blocks, lines_set):
+    # flag the rows with a line in any pane
+    nulls = (None,) * len(lines_set)
+    keep = [row != nulls for row in zip(*lines_set)]
+    new_blocks, i = [], 0
+    for n in blocks:
+        n_keep = keep[i:i + n].count(True)
+        if n_keep > 0:
+            new_blocks.append(n_keep)
+        i += n
+    blocks[:] = new_blocks
+    for lines in lines_set:
+        lines[:] = itertools.compress(lines, keep)
 
 
 # use Pango.SCALE instead of Pango.PIXELS to avoid overflow exception
@@ -4130,3 +4699,4 @@ GObject.signal_new('mode-changed', FileDiffViewerBase, GObject.SignalFlags.RUN_L
 GObject.signal_new('cursor-changed', FileDiffViewerBase, GObject.SignalFlags.RUN_LAST, GObject.TYPE_NONE, ())  # noqa: E501
 GObject.signal_new('syntax-changed', FileDiffViewerBase, GObject.SignalFlags.RUN_LAST, GObject.TYPE_NONE, (str, ))  # noqa: E501
 GObject.signal_new('format-changed', FileDiffViewerBase, GObject.SignalFlags.RUN_LAST, GObject.TYPE_NONE, (int, int))  # noqa: E501
+GObject.signal_new('approximate-alignment-changed', FileDiffViewerBase, GObject.SignalFlags.RUN_LAST, GObject.TYPE_NONE, (bool, ))  # noqa: E501
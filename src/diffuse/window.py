@@ -21,14 +21,16 @@ import os
 import codecs
 import shlex
 import stat
+import threading
 import webbrowser
 
 from gettext import gettext as _
-from typing import List, Optional
+from typing import Any, List, Optional
 from urllib.parse import urlparse
 
 from diffuse import constants, utils
 from diffuse.dialogs import FileChooserDialog, NumericDialog, SearchDialog
+from diffuse.diffengines.engine_interface import DiffBudget
 from diffuse.preferences import Preferences
 from diffuse.resources import theResources
 from diffuse.utils import LineEnding
@@ -196,6 +198,23 @@ class PaneFooter(Gtk.Box):
         self.cursor.set_size_request(-1, -1)
         self.pack_start(label, False, False, 0)
 
+        # progress indicator and cancel button shown while loading a file
+        self.spinner = Gtk.Spinner()
+        self.pack_start(self.spinner, False, False, 5)
+
+        self.progress = label = Gtk.Label()
+        self.pack_start(label, False, False, 0)
+
+        self.cancel_button = button = Gtk.Button()
+        button.set_relief(Gtk.ReliefStyle.NONE)
+        button.set_can_focus(False)
+        image = Gtk.Image()
+        image.set_from_icon_name('process-stop-symbolic', Gtk.IconSize.MENU)
+        button.add(image)
+        button.set_tooltip_text(_('Cancel Loading'))
+        button.connect('clicked', self.cancel_cb)
+        self.pack_start(button, False, False, 0)
+
         separator = Gtk.Separator(orientation=Gtk.Orientation.VERTICAL)
         self.pack_end(separator, False, False, 10)
 
@@ -213,6 +232,24 @@ class PaneFooter(Gtk.Box):
 
         self.set_size_request(0, self.get_size_request()[1])
         self.show_all()
+        self.setProgress(None)
+
+    # callback for the cancel button
+    def cancel_cb(self, widget: Gtk.Widget) -> None:
+        self.emit('cancel')
+
+    # show the progress of loading a file or hide it if 's' is None
+    def setProgress(self, s: Optional[str]) -> None:
+        widgets = (self.spinner, self.progress, self.cancel_button)
+        if s is None:
+            self.spinner.stop()
+            for w in widgets:
+                w.hide()
+        else:
+            self.progress.set_text(s)
+            self.spinner.start()
+            for w in widgets:
+                w.show_all()
 
     # set the cursor label
     def updateCursor(self, viewer: FileDiffViewerBase, f: int) -> None:
@@ -249,6 +286,35 @@ class PaneFooter(Gtk.Box):
         self.encoding.set_text(s)
 
 
+class _LoadJob:
+    """A file being loaded into a pane.
+
+    The job is shared between the main loop and the worker threads reading
+    and aligning the file.
+    """
+
+    def __init__(self, f: int, info: FileInfo, undoable: bool) -> None:
+        self.f = f
+        self.info = info
+        self.undoable = undoable
+        self.cancelled = False
+        self.progress: Optional[str] = None
+        # result of reading the file
+        self.ss: List[str] = []
+        self.encoding = info.encoding
+        self.stat: Optional[os.stat_result] = None
+        self.error: Optional[str] = None
+        # result of aligning the lines with the other panes
+        self.budget = DiffBudget()
+        self.snapshot: Any = None
+        self.contents: Any = None
+
+    def cancel(self) -> None:
+        """Stops any alignment in progress and discards the result."""
+        self.cancelled = True
+        self.budget.cancel()
+
+
 class FileDiffViewer(FileDiffViewerBase):
     """Specialization of FileDiffViewerBase for Diffuse."""
 
@@ -258,6 +324,15 @@ class FileDiffViewer(FileDiffViewerBase):
         self.title = title
         self.status: Optional[str] = ''
 
+        # files being loaded into each pane
+        self.load_jobs: List[Optional[_LoadJob]] = [None] * n
+        # files waiting to be aligned and the one currently being aligned
+        self.align_queue: List[_LoadJob] = []
+        self.aligning: Optional[_LoadJob] = None
+        # True if the viewer should be closed if the files have no
+        # differences once they are loaded
+        self.close_if_same = False
+
         self.headers: List[PaneHeader] = []
         self.footers: List[PaneFooter] = []
         for i in range(n):
@@ -275,6 +350,7 @@ class FileDiffViewer(FileDiffViewerBase):
             # pane footer
             w = PaneFooter()
             self.footers.append(w)
+            w.connect('cancel', self.cancel_load_button_cb, i)
             self.attach(w, i, 2, 1, 1)
             w.show()
 
@@ -283,6 +359,8 @@ class FileDiffViewer(FileDiffViewerBase):
         self.connect('mode-changed', self.mode_changed_cb)
         self.connect('cursor-changed', self.cursor_changed_cb)
         self.connect('format-changed', self.format_changed_cb)
+        self.connect('approximate-alignment-changed', self.approximate_alignment_changed_cb)
+        self.connect('destroy', self.destroy_cb)
 
         for i, darea in enumerate(self.dareas):
             darea.drag_dest_set(
@@ -320,11 +398,7 @@ class FileDiffViewer(FileDiffViewerBase):
             elif response != Gtk.ResponseType.REJECT:
                 # cancel if the user did not choose 'yes' or 'no'
                 return
-        self.openUndoBlock()
-        self.recordEditMode()
-        self.load(f, info)
-        self.recordEditMode()
-        self.closeUndoBlock()
+        self.load(f, info, True)
 
     # callback used when receiving drag-n-drop data
     def drag_data_received_cb(self, widget, context, x, y, selection, targettype, eventtime, f):
@@ -379,17 +453,89 @@ class FileDiffViewer(FileDiffViewerBase):
         h.info.encoding = encoding
         self.footers[f].setEncoding(encoding)
 
-    # load a new file into pane 'f'
-    # 'info' indicates the name of the file and how to retrieve it from the
-    # version control system if applicable
-    def load(self, f: int, info: FileInfo) -> None:
+    # load the file described by 'info' into pane 'f'
+    #
+    # The file is read and aligned with the other panes using worker threads
+    # and the result is applied to the pane from the main loop.  If
+    # 'undoable' is True, the new contents are added to the undo stack as a
+    # single undo block.
+    def load(self, f: int, info: FileInfo, undoable: bool = False) -> None:
+        job = self.load_jobs[f]
+        if job is not None:
+            self._discardLoad(job)
+        job = _LoadJob(f, info, undoable)
+        self.load_jobs[f] = job
+        self._setLoadProgress(job, _('Loading...'))
+        threading.Thread(target=self._readContents, args=(job, ), daemon=True).start()
+
+    # returns True if any files are still being loaded
+    def isLoading(self) -> bool:
+        return any(job is not None for job in self.load_jobs)
+
+    # stop loading a file into pane 'f' and keep its current contents
+    def cancelLoad(self, f: int) -> None:
+        job = self.load_jobs[f]
+        if job is not None:
+            self._discardLoad(job)
+            self._finishLoad(job)
+
+    # callback for the cancel button in the pane footer
+    def cancel_load_button_cb(self, widget, f):
+        self.cancelLoad(f)
+
+    # stop loading all files without using their results, used when the
+    # viewer is closed
+    #
+    # 'load-finished' is not emitted.  The job being aligned stays in
+    # self.aligning until its worker thread finishes so only one file is
+    # aligned at a time.
+    def cancelLoads(self) -> None:
+        for f, job in enumerate(self.load_jobs):
+            if job is not None:
+                self._discardLoad(job)
+                self.load_jobs[f] = None
+                self.footers[f].setProgress(None)
+        for job in self.align_queue:
+            job.cancel()
+        del self.align_queue[:]
+        if self.aligning is not None:
+            self.aligning.cancel()
+
+    # callback used when the viewer is destroyed
+    def destroy_cb(self, widget):
+        self.cancelLoads()
+
+    # displays the progress of 'job' in its pane's footer
+    def _setLoadProgress(self, job: _LoadJob, s: str) -> None:
+        job.progress = s
+        self.footers[job.f].setProgress(s)
+
+    # prevents the result of 'job' from being used
+    def _discardLoad(self, job: _LoadJob) -> None:
+        job.cancel()
+        if job in self.align_queue:
+            self.align_queue.remove(job)
+
+    # clears the progress indicator once 'job' is done
+    def _finishLoad(self, job: _LoadJob) -> None:
+        f = job.f
+        if self.load_jobs[f] is job:
+            self.load_jobs[f] = None
+            self.footers[f].setProgress(None)
+            if not self.isLoading():
+                if not job.undoable and self.get_realized():
+                    # the viewer was displayed before the files were loaded
+                    self.goToStartLine()
+                self.emit('load-finished')
+
+    # reads the file for 'job'
+    #
+    # This runs on a worker thread and must not modify the viewer.
+    def _readContents(self, job: _LoadJob) -> None:
+        info = job.info
         name = info.name
         encoding = info.encoding
-        stat = None
-        if name is None:
-            # reset to an empty pane
-            ss = []
-        else:
+        if name is not None:
             rev = info.revision
             try:
                 if rev is None:
@@ -397,7 +543,7 @@ class FileDiffViewer(FileDiffViewerBase):
                     with open(name, 'rb') as fd:
                         contents = fd.read()
                     # get the file's modification times so we can detect changes
-                    stat = os.stat(name)
+                    job.stat = os.stat(name)
                 else:
                     if info.vcs is None:
                         raise IOError('Not under version control.')
@@ -409,27 +555,96 @@ class FileDiffViewer(FileDiffViewerBase):
                     s, encoding = self.prefs.convertToUnicode(contents)
                 else:
                     s = str(contents, encoding=encoding)
-                ss = utils.splitlines(s)
+                job.ss = utils.splitlines(s)
+                job.encoding = encoding
             except (IOError, OSError, UnicodeDecodeError, LookupError):
-                # FIXME: this can occur before the toplevel window is drawn
                 if rev is not None:
-                    msg = _(
+                    job.error = _(
                         'Error reading revision %(rev)s of %(file)s.'
                     ) % {'rev': rev, 'file': name}
                 else:
-                    msg = _('Error reading %s.') % (name, )
-                utils.logErrorAndDialog(msg, self.get_toplevel())
-                return
-        # update the panes contents, last modified time, and title
-        self.replaceContents(f, ss)
-        info.encoding = encoding
-        info.last_stat = info.stat = stat
+                    job.error = _('Error reading %s.') % (name, )
+        GLib.idle_add(self._contentsRead, job)
+
+    # called from the main loop once the file for 'job' has been read
+    def _contentsRead(self, job: _LoadJob) -> bool:
+        if job.cancelled:
+            # the load was replaced or cancelled, or the viewer was closed
+            return False
+        if job.error is not None:
+            self._finishLoad(job)
+            # FIXME: this can occur before the toplevel window is drawn
+            utils.logErrorAndDialog(job.error, self.get_toplevel())
+        else:
+            self._setLoadProgress(job, _('Aligning...'))
+            self.align_queue.append(job)
+            self._alignNext()
+        return False
+
+    # starts aligning the next file in the queue
+    #
+    # Files are aligned one at a time as each alignment depends upon the
+    # contents of the other panes.
+    def _alignNext(self) -> None:
+        if self.aligning is None and len(self.align_queue) > 0:
+            job = self.align_queue.pop(0)
+            self.aligning = job
+            job.snapshot = self.snapshotAlignment(job.f)
+            job.budget = self._createAlignBudget()
+            threading.Thread(target=self._alignContents, args=(job, ), daemon=True).start()
+
+    # aligns the lines for 'job' with the snapshot of the other panes
+    #
+    # This runs on a worker thread and must not modify the viewer.
+    def _alignContents(self, job: _LoadJob) -> None:
+        try:
+            job.contents = self.alignContents(job.f, job.ss, job.snapshot, job.budget)
+        finally:
+            GLib.idle_add(self._contentsAligned, job)
+
+    # called from the main loop once the lines for 'job' have been aligned
+    def _contentsAligned(self, job: _LoadJob) -> bool:
+        if self.aligning is job:
+            self.aligning = None
+        if job.cancelled:
+            # the load was replaced or cancelled, or the viewer was closed,
+            # start aligning the next file if any are still waiting
+            self._alignNext()
+            return False
+        if job.contents is None:
+            # alignment failed
+            self._finishLoad(job)
+        elif not self.isSnapshotCurrent(job.snapshot):
+            # the panes were modified while aligning so try again
+            job.contents = None
+            self.align_queue.insert(0, job)
+        else:
+            self._applyLoad(job)
+            self._finishLoad(job)
+        self._alignNext()
+        return False
+
+    # update the pane's contents, last modified time, and title
+    def _applyLoad(self, job: _LoadJob) -> None:
+        f, info = job.f, job.info
+        # loads are normally applied from the main loop where no undo block
+        # will be open
+        undoable = job.undoable and self.undoblock is None
+        if undoable:
+            self.openUndoBlock()
+            self.recordEditMode()
+        self.applyContents(f, job.contents)
+        info.encoding = job.encoding
+        info.last_stat = info.stat = job.stat
         self.setFileInfo(f, info)
         # use the file name to choose appropriate syntax highlighting rules
-        if name is not None:
-            syntax = theResources.guessSyntaxForFile(name, ss)
+        if info.name is not None:
+            syntax = theResources.guessSyntaxForFile(info.name, job.ss)
             if syntax is not None:
                 self.setSyntax(syntax)
+        if undoable:
+            self.recordEditMode()
+            self.closeUndoBlock()
 
     # load a new file into pane 'f'
     def open_file(self, f: int, reload: bool = False) -> None:
@@ -626,6 +841,16 @@ class FileDiffViewer(FileDiffViewerBase):
         info0, info1 = f1.info, f0.info
         self.setFileInfo(f_dst, info0)
         self.setFileInfo(f_src, info1)
+        # files being loaded follow their panes
+        jobs = self.load_jobs
+        jobs[f_dst], jobs[f_src] = jobs[f_src], jobs[f_dst]
+        for f in f_dst, f_src:
+            job = jobs[f]
+            if job is None:
+                self.footers[f].setProgress(None)
+            else:
+                job.f = f
+                self.footers[f].setProgress(job.progress)
 
     # callback to receive notification when the name of a file changes
     def num_edits_changed_cb(self, widget, f):
@@ -635,6 +860,10 @@ class FileDiffViewer(FileDiffViewerBase):
     def mode_changed_cb(self, widget):
         self.updateStatus()
 
+    # callback to record changes to whether the alignment is approximate
+    def approximate_alignment_changed_cb(self, widget, approximate):
+        self.updateStatus()
+
     # update the viewer's current status message
     def updateStatus(self) -> None:
         if self.mode == EditMode.LINE:
@@ -651,6 +880,12 @@ class FileDiffViewer(FileDiffViewerBase):
             )
         else:
             s = None
+        if self.approximate_alignment:
+            msg = _(
+                'Lines were aligned approximately as the time limit was exceeded. Use '
+                'Realign All for an exact alignment.'
+            )
+            s = msg if s is None else f'{msg} {s}'
         self.status = s
         self.emit('status-changed', s)
 
@@ -1133,6 +1368,8 @@ class DiffuseWindow(Gtk.ApplicationWindow):
         if nb.get_n_pages() > 1:
             # warn about losing unsaved changes before removing a tab
             if self.confirmCloseViewers([data]):
+                # files still being loaded are not loaded into closed tabs
+                data.cancelLoads()
                 self.closed_tabs.append((nb.page_num(data), data, nb.get_tab_label(data)))
                 nb.remove(data)
                 nb.set_show_tabs(self.prefs.getBool('tabs_always_show') or nb.get_n_pages() > 1)
@@ -1238,6 +1475,7 @@ class DiffuseWindow(Gtk.ApplicationWindow):
         viewer.connect('title-changed', self.title_changed_cb)
         viewer.connect('status-changed', self.status_changed_cb)
         viewer.connect('syntax-changed', self.syntax_changed_cb)
+        viewer.connect('load-finished', self.load_finished_cb)
         return viewer
 
     # create a new viewer to display 'items'
@@ -1380,9 +1618,20 @@ class DiffuseWindow(Gtk.ApplicationWindow):
     # close all tabs without differences
     def closeOnSame(self) -> None:
         for i in range(self.notebook.get_n_pages() - 1, -1, -1):
-            if not self.notebook.get_nth_page(i).hasDifferences():
+            viewer = self.notebook.get_nth_page(i)
+            if viewer.isLoading():
+                # check again once the files have been loaded
+                viewer.close_if_same = True
+            elif not viewer.hasDifferences():
                 self.notebook.remove_page(i)
 
+    # callback used when a viewer has finished loading its files
+    def load_finished_cb(self, widget):
+        if widget.close_if_same:
+            widget.close_if_same = False
+            if not widget.hasDifferences():
+                self.notebook.remove_page(self.notebook.page_num(widget))
+
     # returns True if the application can safely quit
     def confirmQuit(self) -> bool:
         nb = self.notebook
@@ -1792,6 +2041,8 @@ def _append_buttons(box, size, specs):
 
 GObject.signal_new('title-changed', FileDiffViewer, GObject.SignalFlags.RUN_LAST, GObject.TYPE_NONE, (str, ))  # noqa: E501
 GObject.signal_new('status-changed', FileDiffViewer, GObject.SignalFlags.RUN_LAST, GObject.TYPE_NONE, (str, ))  # noqa: E501
+GObject.signal_new('load-finished', FileDiffViewer, GObject.SignalFlags.RUN_LAST, GObject.TYPE_NONE, ())  # noqa: E501
+GObject.signal_new('cancel', PaneFooter, GObject.SignalFlags.RUN_LAST, GObject.TYPE_NONE, ())
 GObject.signal_new('title-changed', PaneHeader, GObject.SignalFlags.RUN_LAST, GObject.TYPE_NONE, ())
 GObject.signal_new('open', PaneHeader, GObject.SignalFlags.RUN_LAST, GObject.TYPE_NONE, ())
 GObject.signal_new('reload', PaneHeader, GObject.SignalFlags.RUN_LAST, GObject.TYPE_NONE, ())
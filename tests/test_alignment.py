@@ -0,0 +1,308 @@
+# Diffuse: a graphical tool for merging and comparing text files.
+#
+# Copyright (C) 2019 Derrick Moser <derrick_moser@yahoo.com>
+# Copyright (C) 2021 Romain Failliot <romain.failliot@foolstep.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# These tests compare the alignment helpers of the file viewer with the
+# simpler implementations they replaced on randomly generated inputs.
+#
+# usage: pytest tests/
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from diffuse import widgets  # noqa: E402
+from diffuse.diffengines.engine_interface import DiffBudget  # noqa: E402
+from diffuse.diffengines.engine_registry import theDiffEngines  # noqa: E402
+
+Line = widgets.FileDiffViewerBase.Line
+
+SEEDS = range(20)
+
+
+# reference implementation of _remove_null_lines() deleting one row at a time
+def reference_remove_null_lines(blocks, lines_set):
+    bi, bn, i = 0, 0, 0
+    while bi < len(blocks):
+        while i < bn + blocks[bi]:
+            for lines in lines_set:
+                if lines[i] is not None:
+                    i += 1
+                    break
+            else:
+                for lines in lines_set:
+                    del lines[i]
+                blocks[bi] -= 1
+        if blocks[bi] == 0:
+            del blocks[bi]
+        else:
+            bn += blocks[bi]
+            bi += 1
+
+
+# reference implementation of _insert_nulls() inserting one row at a time
+def reference_insert_nulls(lines, rows):
+    result = lines[:]
+    for i in rows:
+        result.insert(i, None)
+    return result
+
+
+# reference implementation of FileDiffViewerBase.alignBlocks() inserting
+# spacer lines one row at a time
+def reference_align_blocks(
+        leftblocks, leftlines, rightblocks, rightlines, get_hash, algorithm):
+    blocks = (leftblocks, rightblocks)
+    lines = (leftlines, rightlines)
+    middle = (leftlines[-1], rightlines[0])
+    mlines = ([line for line in middle[0] if line is not None],
+              [line for line in middle[1] if line is not None])
+    s1, s2 = mlines
+    n1, n2 = 0, 0
+    t1 = [get_hash(s) for s in s1]
+    t2 = [get_hash(s) for s in s2]
+    for block in theDiffEngines.diff(algorithm, t1, t2, DiffBudget()):
+        delta = (n1 + block[0]) - (n2 + block[1])
+        if delta < 0:
+            i = n1 + block[0]
+            s1[i:i] = -delta * [None]
+            n1 -= delta
+        elif delta > 0:
+            i = n2 + block[1]
+            s2[i:i] = delta * [None]
+            n2 += delta
+    nmatch = len(s1)
+    i, k = 0, 0
+    bi = [0, 0]
+    bn = [0, 0]
+    while True:
+        insert = [i >= len(m) for m in middle]
+        if insert == [True, True]:
+            break
+        if insert == [False, False] and k < nmatch:
+            accept = True
+            for j in range(2):
+                m = mlines[j][k]
+                if middle[j][i] is not m:
+                    if m is None:
+                        insert[j] = True
+                    else:
+                        accept = False
+            if accept:
+                k += 1
+            else:
+                insert = [m[i] is not None for m in middle]
+        for j in range(2):
+            if insert[j]:
+                for temp in lines[j]:
+                    temp.insert(i, None)
+                blocksj = blocks[j]
+                bij = bi[j]
+                bnj = bn[j]
+                if len(blocksj) == 0:
+                    blocksj.append(0)
+                while bnj + blocksj[bij] < i:
+                    bnj += blocksj[bij]
+                    bij += 1
+                blocksj[bij] += 1
+        i += 1
+
+
+# reference implementation of _cut_blocks() walking every block
+def reference_cut_blocks(i, blocks):
+    pre, post, nlines = [], [], 0
+    for b in blocks:
+        if nlines >= i:
+            post.append(b)
+        elif nlines + b <= i:
+            pre.append(b)
+        else:
+            n = i - nlines
+            pre.append(n)
+            post.append(b - n)
+        nlines += b
+    return pre, post
+
+
+# reference implementation of _merge_blocks() removing the head of each list
+def reference_merge_blocks(leftblocks, rightblocks):
+    leftblocks, rightblocks, b = leftblocks[:], rightblocks[:], []
+    while len(leftblocks) > 0:
+        nleft, nright = leftblocks[0], rightblocks[0]
+        n = min(nleft, nright)
+        if n < nleft:
+            leftblocks[0] -= n
+        else:
+            del leftblocks[0]
+        if n < nright:
+            rightblocks[0] -= n
+        else:
+            del rightblocks[0]
+        b.append(n)
+    return b
+
+
+# reference implementation of FileDiffViewerBase.Blocks.getSpan() on a list
+# of block sizes
+def reference_span(blocks, start, end):
+    i, first, sizes = 0, None, []
+    for b in blocks:
+        if i + b > start and (i < end or len(sizes) == 0):
+            if first is None:
+                first = i
+            sizes.append(b)
+        i += b
+    if first is None:
+        first = i
+    return first, sizes
+
+
+# reference implementation of FileDiffViewerBase.Blocks.replace() on a list
+# of block sizes
+def reference_replace_blocks(blocks, start, end, sizes):
+    pre, post = reference_cut_blocks(end, blocks)
+    pre, _ = reference_cut_blocks(start, pre)
+    return pre + sizes + post
+
+
+# returns 'n' rows of lines for each of 'npanes' panes with some spacer lines
+def random_panes(rnd, npanes, n, vocabulary, spacers=0.3):
+    panes = [[] for _ in range(npanes)]
+    for i in range(n):
+        for lines in panes:
+            if rnd.random() < spacers:
+                lines.append(None)
+            else:
+                lines.append(Line(i + 1, f'{rnd.randrange(vocabulary)}\n'))
+    return panes
+
+
+# returns a random list of block sizes adding up to 'n'
+def random_blocks(rnd, n):
+    blocks = []
+    while n > 0:
+        size = rnd.randint(1, min(n, 6))
+        blocks.append(size)
+        n -= size
+    return blocks
+
+
+# returns the lines in a form that can be compared with ==
+def identities(panes):
+    return [[None if line is None else id(line) for line in lines] for lines in panes]
+
+
+def get_hash(line):
+    return line.getText()
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_remove_null_lines(seed):
+    rnd = random.Random(seed)
+    for _ in range(50):
+        n = rnd.randint(0, 40)
+        panes = random_panes(rnd, rnd.randint(1, 4), n, 5, spacers=rnd.random())
+        blocks = random_blocks(rnd, n)
+        expected_panes = [lines[:] for lines in panes]
+        expected_blocks = blocks[:]
+        reference_remove_null_lines(expected_blocks, expected_panes)
+        widgets._remove_null_lines(blocks, panes)
+        assert blocks == expected_blocks
+        assert identities(panes) == identities(expected_panes)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_insert_nulls(seed):
+    rnd = random.Random(seed)
+    for _ in range(50):
+        lines = list(range(rnd.randint(0, 40)))
+        # rows are listed in increasing order and refer to the final list
+        n = rnd.randint(0, 20)
+        rows = sorted(rnd.sample(range(len(lines) + n), n))
+        assert widgets._insert_nulls(lines, rows) == reference_insert_nulls(lines, rows)
+
+
+@pytest.mark.parametrize('algorithm', theDiffEngines.getNames())
+@pytest.mark.parametrize('seed', SEEDS)
+def test_align_blocks(seed, algorithm):
+    rnd = random.Random(seed)
+    for _ in range(20):
+        vocabulary = rnd.choice([2, 4, 20])
+        left = random_panes(rnd, rnd.randint(1, 3), rnd.randint(0, 30), vocabulary)
+        right = random_panes(rnd, rnd.randint(1, 3), rnd.randint(0, 30), vocabulary)
+        leftblocks = random_blocks(rnd, len(left[0]))
+        rightblocks = random_blocks(rnd, len(right[0]))
+        expected_left = [lines[:] for lines in left]
+        expected_right = [lines[:] for lines in right]
+        expected_leftblocks = leftblocks[:]
+        expected_rightblocks = rightblocks[:]
+        reference_align_blocks(
+            expected_leftblocks, expected_left, expected_rightblocks, expected_right,
+            get_hash, algorithm)
+        widgets.FileDiffViewerBase.alignBlocks(
+            None, leftblocks, left, rightblocks, right, get_hash=get_hash, algorithm=algorithm)
+        assert leftblocks == expected_leftblocks
+        assert rightblocks == expected_rightblocks
+        assert identities(left) == identities(expected_left)
+        assert identities(right) == identities(expected_right)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_cut_and_merge_blocks(seed):
+    rnd = random.Random(seed)
+    for _ in range(50):
+        n = rnd.randint(0, 40)
+        leftblocks = random_blocks(rnd, n)
+        rightblocks = random_blocks(rnd, n)
+        i = rnd.randint(0, n)
+        assert widgets._cut_blocks(i, leftblocks) == reference_cut_blocks(i, leftblocks)
+        assert (widgets._merge_blocks(leftblocks, rightblocks) ==
+                reference_merge_blocks(leftblocks, rightblocks))
+
+
+# small chunks exercise splitting chunks and removing empty chunks
+@pytest.mark.parametrize('chunk', [1, 2, 3, 256])
+@pytest.mark.parametrize('seed', SEEDS)
+def test_blocks(seed, chunk, monkeypatch):
+    monkeypatch.setattr(widgets, '_BLOCK_INDEX_CHUNK', chunk)
+    rnd = random.Random(seed)
+    for _ in range(10):
+        expected = random_blocks(rnd, rnd.randint(0, 60))
+        original = expected[:]
+        blocks = widgets.FileDiffViewerBase.Blocks(expected[:])
+        changes = []
+        for _ in range(30):
+            n = blocks.rows
+            start = rnd.randint(0, n)
+            end = rnd.choice([start, rnd.randint(start, n)])
+            assert blocks.getSpan(start, end) == reference_span(expected, start, end)
+            cut = reference_cut_blocks(start, reference_cut_blocks(end, expected)[0])[1]
+            assert blocks.getCut(start, end) == cut
+            sizes = random_blocks(rnd, rnd.choice([0, 0, 3, 10, 40]))
+            expected = reference_replace_blocks(expected, start, end, sizes)
+            changes.append(blocks.replace(start, end, sizes))
+            assert blocks.tolist() == expected
+            assert blocks.rows == sum(expected)
+        # the results of replace() reverse the changes
+        for row, old, new in reversed(changes):
+            blocks.replace(row, row + sum(new), old)
+        assert blocks.tolist() == original
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+# Diffuse: a graphical tool for merging and comparing text files.
+#
+# Copyright (C) 2019 Derrick Moser <derrick_moser@yahoo.com>
+# Copyright (C) 2021 Romain Failliot <romain.failliot@foolstep.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# This program measures the time taken to align and realign generated
+# comparisons of increasing size where half of the lines of one file are
+# missing from the other.  It runs Diffuse from the source tree and needs GTK.
+#
+# usage: benchmark_alignment.py [--sizes N,N,...]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from diffuse.widgets import FileDiffViewerBase  # noqa: E402
+from diffuse.preferences import Preferences  # noqa: E402
+
+
+# copy of 'lines' with half of the lines removed and half of the rest replaced
+def misalign_lines(rnd, lines):
+    result = []
+    for s in lines:
+        r = rnd.random()
+        if r < 0.5:
+            continue
+        result.append(s if r < 0.75 else f'new {rnd.random()}\n')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure alignment speed.')
+    parser.add_argument('--sizes', default='25000,50000,100000,200000')
+    args = parser.parse_args()
+
+    prefs = Preferences(os.path.join(tempfile.mkdtemp(), 'prefs'))
+    for n in [int(s) for s in args.sizes.split(',')]:
+        rnd = random.Random(0)
+        lines = [f'line {i}\n' for i in range(n)]
+        viewer = FileDiffViewerBase(2, prefs)
+        viewer.replaceContents(0, lines)
+        start = time.perf_counter()
+        viewer.replaceContents(1, misalign_lines(rnd, lines))
+        load = time.perf_counter() - start
+        start = time.perf_counter()
+        viewer.openUndoBlock()
+        viewer.realign_all()
+        viewer.closeUndoBlock()
+        realign = time.perf_counter() - start
+        print(f'lines: {n}  load: {load:.2f} s  realign: {realign:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
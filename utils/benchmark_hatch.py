@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+# Diffuse: a graphical tool for merging and comparing text files.
+#
+# Copyright (C) 2019 Derrick Moser <derrick_moser@yahoo.com>
+# Copyright (C) 2021 Romain Failliot <romain.failliot@foolstep.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# This program measures the time taken to draw the hatching of a pane that is
+# mostly spacing lines by stroking zig-zag lines across each of them, as
+# Diffuse used to, and by filling them with the cached hatch pattern.  The
+# other lines only have their background filled.  It paints into an image
+# surface so it does not need a display.
+#
+# usage: benchmark_hatch.py [--width PIXELS] [--height PIXELS]
+#                           [--font-height PIXELS] [--spacers PERCENT]
+#                           [--frames N]
+
+import argparse
+import os
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+# importing utils first avoids a circular import with resources
+from diffuse import utils  # noqa: E402,F401
+from diffuse.resources import theResources  # noqa: E402
+from diffuse.widgets import FileDiffViewerBase  # noqa: E402
+
+import gi  # type: ignore # noqa: E402
+gi.require_foreign('cairo')
+import cairo  # type: ignore # noqa: E402
+
+# width of the line numbers to the left of the hatching
+LINE_NUMBER_WIDTH = 60
+
+
+# draws the hatching of the spacing line at 'y_start' by stroking zig-zag
+# lines like Diffuse did before the hatch pattern was cached
+def stroke_hatching(cr, y_start, maxx, h):
+    colour = theResources.getColour('hatch')
+    cr.set_source_rgb(colour.red, colour.green, colour.blue)
+    cr.set_line_width(1)
+    h2 = 2 * h
+    h_half = 0.5 * h
+    phase = [h_half, h_half, -h_half, -h_half]
+    for j in range(4):
+        x_temp = LINE_NUMBER_WIDTH
+        y_temp = y_start
+        for k in range(j):
+            y_temp += phase[k]
+        cr.move_to(x_temp, y_temp)
+        for k in range(j, 4):
+            cr.rel_line_to(h_half, phase[k])
+            x_temp += h_half
+        while x_temp < maxx:
+            cr.rel_line_to(h, h)
+            cr.rel_line_to(h, -h)
+            x_temp += h2
+        cr.stroke()
+
+
+# draws the hatching of the spacing line at 'y_start' with the hatch pattern
+def fill_hatching(viewer, cr, y_start, maxx, h):
+    cr.set_source(FileDiffViewerBase._getHatchPattern(viewer, cr, LINE_NUMBER_WIDTH))
+    cr.rectangle(LINE_NUMBER_WIDTH, y_start, maxx - LINE_NUMBER_WIDTH, h)
+    cr.fill()
+
+
+# fills the background of the line at 'y_start'
+def fill_background(cr, y_start, maxx, h):
+    colour = theResources.getColour('text_background')
+    cr.set_source_rgb(colour.red, colour.green, colour.blue)
+    cr.rectangle(LINE_NUMBER_WIDTH, y_start, maxx - LINE_NUMBER_WIDTH, h)
+    cr.fill()
+
+
+# returns the average time taken to draw a frame with 'draw' for the spacing
+# lines, 'spacers' is the percentage of lines that are spacing lines
+def measure(draw, width, height, h, spacers, frames):
+    surface = cairo.ImageSurface(cairo.Format.RGB24, width, height)
+    cr = cairo.Context(surface)
+    start = time.perf_counter()
+    for _ in range(frames):
+        for i, y in enumerate(range(0, height, h)):
+            # spread the text lines evenly between the spacing lines
+            if (i + 1) * (100 - spacers) // 100 > i * (100 - spacers) // 100:
+                fill_background(cr, y, width, h)
+            else:
+                draw(cr, y, width, h)
+    surface.flush()
+    return (time.perf_counter() - start) / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the time taken to draw hatching.')
+    parser.add_argument('--width', type=int, default=3840)
+    parser.add_argument('--height', type=int, default=2160)
+    parser.add_argument('--font-height', type=int, default=17)
+    parser.add_argument('--spacers', type=int, default=90, help='percentage of spacing lines')
+    parser.add_argument('--frames', type=int, default=20)
+    args = parser.parse_args()
+
+    # only the attributes used by _getHatchPattern() are needed
+    viewer = types.SimpleNamespace(font_height=args.font_height, _hatch_pattern=None)
+    rows = (args.height + args.font_height - 1) // args.font_height
+    print(f'size: {args.width}x{args.height}  font height: {args.font_height}  '
+          f'lines per frame: {rows}  spacing lines: {args.spacers}%')
+    for name, draw in (
+            ('stroked', stroke_hatching),
+            ('pattern', lambda cr, y, maxx, h: fill_hatching(viewer, cr, y, maxx, h))):
+        ms = measure(
+            draw, args.width, args.height, args.font_height, args.spacers, args.frames) * 1000
+        print(f'{name}: {ms:.2f} ms per frame')
+
+
+if __name__ == '__main__':
+    main()
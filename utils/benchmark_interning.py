@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+# Diffuse: a graphical tool for merging and comparing text files.
+#
+# Copyright (C) 2019 Derrick Moser <derrick_moser@yahoo.com>
+# Copyright (C) 2021 Romain Failliot <romain.failliot@foolstep.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# This program measures the time taken to load a large generated
+# configuration file alongside an edited copy with the alignment hashes
+# interned as integers and, for comparison, with the hashes passed to the
+# diff engines as strings.  The time taken by the diff engines alone is also
+# reported as the best of several runs, the interned time includes the
+# interning.  Comparing strings costs more when the lines share long
+# prefixes, '--indent' prefixes each line with that many spaces.  It runs
+# Diffuse from the source tree and needs GTK.
+#
+# usage: benchmark_interning.py [--lines N] [--edits N] [--indent N]
+#                               [--repeat N]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from diffuse import widgets  # noqa: E402
+from diffuse.diffengines.engine_interface import DiffBudget  # noqa: E402
+from diffuse.diffengines.engine_registry import theDiffEngines  # noqa: E402
+from diffuse.preferences import Preferences  # noqa: E402
+
+
+# create 'n' lines of configuration file like text with many repeated lines
+def make_lines(rnd, n, indent):
+    lines = []
+    for i in range(n):
+        if i % 10 == 0:
+            lines.append(f'{indent}[section{i // 10}]\n')
+        elif i % 10 == 9:
+            lines.append('\n')
+        else:
+            lines.append(f'{indent}option{i % 10} = {rnd.randint(0, 100)}\n')
+    return lines
+
+
+# copy of 'lines' with 'edits' lines changed, removed or added
+def edit_lines(rnd, lines, edits, indent):
+    result = lines[:]
+    for _ in range(edits):
+        i = rnd.randrange(len(result))
+        r = rnd.random()
+        if r < 0.4:
+            result[i] = f'{indent}option{rnd.randint(0, 9)} = {rnd.randint(0, 100)}\n'
+        elif r < 0.7:
+            del result[i]
+        else:
+            result.insert(i, f'{indent}added = {rnd.randint(0, 100)}\n')
+    return result
+
+
+# passes the alignment hashes to the diff engines without interning them
+def _no_interning(a, b):
+    return list(a), list(b)
+
+
+# returns the time taken to load 'contents' and the resulting blocks
+def load(prefs, contents):
+    viewer = widgets.FileDiffViewerBase(len(contents), prefs)
+    start = time.perf_counter()
+    for f, ss in enumerate(contents):
+        viewer.replaceContents(f, ss)
+    return time.perf_counter() - start, viewer.blocks.tolist()
+
+
+# returns the shortest time taken out of 'repeat' runs to compare 'a' and 'b'
+# with the diff engine 'name' after preparing them with 'intern_hashes'
+def diff(name, intern_hashes, a, b, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        theDiffEngines.diff(name, *intern_hashes(a, b), DiffBudget())
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the effect of interning on load time.')
+    parser.add_argument('--lines', type=int, default=200000)
+    parser.add_argument('--edits', type=int, default=2000)
+    parser.add_argument('--indent', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    indent = ' ' * args.indent
+    lines = make_lines(rnd, args.lines, indent)
+    contents = [lines, edit_lines(rnd, lines, args.edits, indent)]
+    prefs = Preferences(os.path.join(tempfile.mkdtemp(), 'prefs'))
+    # do not let the time limit approximate the alignment
+    prefs.setInt('align_time_limit', 0)
+    intern_hashes = widgets._intern_hashes
+    print(f'lines: {args.lines}  edits: {args.edits}  indent: {args.indent}')
+    for name in theDiffEngines.getNames():
+        prefs.setString('align_algorithm', name)
+        widgets._intern_hashes = _no_interning
+        strings, expected = load(prefs, contents)
+        widgets._intern_hashes = intern_hashes
+        integers, blocks = load(prefs, contents)
+        same = 'same' if blocks == expected else 'DIFFERENT'
+        diff_strings = diff(name, _no_interning, *contents, args.repeat)
+        diff_integers = diff(name, intern_hashes, *contents, args.repeat)
+        print(f'{name}: load strings: {strings:.2f} s  integers: {integers:.2f} s  '
+              f'diff strings: {diff_strings:.2f} s  integers: {diff_integers:.2f} s  '
+              f'({diff_strings / diff_integers:.2f}x, {same} alignment)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+# Diffuse: a graphical tool for merging and comparing text files.
+#
+# Copyright (C) 2019 Derrick Moser <derrick_moser@yahoo.com>
+# Copyright (C) 2021 Romain Failliot <romain.failliot@foolstep.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# This program loads a large generated comparison and reports the memory
+# allocated by Python while doing so.  It runs Diffuse from the source tree
+# and needs GTK.
+#
+# usage: benchmark_memory.py [--panes N] [--lines N]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from diffuse.widgets import FileDiffViewerBase  # noqa: E402
+from diffuse.preferences import Preferences  # noqa: E402
+
+
+# create 'n' lines of code-like text
+def make_lines(rnd, n):
+    return [f'    value = self.value + {rnd.randint(0, n)}  # {i}\n' for i in range(n)]
+
+
+# copy of 'lines' with about 'ratio' of the lines changed
+def modify_lines(rnd, lines, ratio):
+    return [s.upper() if rnd.random() < ratio else s for s in lines]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure memory used to load a comparison.')
+    parser.add_argument('--panes', type=int, default=4)
+    parser.add_argument('--lines', type=int, default=100000)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    prefs = Preferences(os.path.join(tempfile.mkdtemp(), 'prefs'))
+    lines = make_lines(rnd, args.lines)
+    contents = [lines] + [modify_lines(rnd, lines, 0.1) for _ in range(args.panes - 1)]
+
+    # only measure the memory allocated by the viewer
+    tracemalloc.start()
+    start = time.perf_counter()
+    viewer = FileDiffViewerBase(args.panes, prefs)
+    for f, ss in enumerate(contents):
+        viewer.replaceContents(f, ss)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mib = 1024 * 1024
+    print(f'panes: {args.panes}  lines: {args.lines}  time: {elapsed:.2f} s')
+    print(f'memory MiB: current {current / mib:.1f}  peak {peak / mib:.1f}  '
+          f'per line {current / (args.panes * args.lines):.0f} bytes')
+
+
+if __name__ == '__main__':
+    main()
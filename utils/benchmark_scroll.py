@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+# Diffuse: a graphical tool for merging and comparing text files.
+#
+# Copyright (C) 2019 Derrick Moser <derrick_moser@yahoo.com>
+# Copyright (C) 2021 Romain Failliot <romain.failliot@foolstep.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# This program scripts a scroll through a large generated comparison and
+# reports the time spent painting each frame.  It runs Diffuse from the source
+# tree and needs a display.
+#
+# usage: benchmark_scroll.py [--panes N] [--lines N] [--frames N] [--step PIXELS]
+#                             [--spacers]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import gi  # type: ignore # noqa: E402
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk  # type: ignore # noqa: E402
+
+from diffuse.widgets import FileDiffViewerBase  # noqa: E402
+from diffuse.preferences import Preferences  # noqa: E402
+
+WORDS = ['self', 'value', 'return', 'if', 'else', 'for', 'in', '=', '+', '(', ')', ':', 'x', '0']
+
+
+# create 'n' lines of code-like text
+def make_lines(rnd, n):
+    lines = []
+    for i in range(n):
+        indent = '    ' * rnd.randint(0, 3)
+        words = ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(0, 12)))
+        lines.append(f'{indent}{words}  # {i}\n')
+    return lines
+
+
+# copy of 'lines' with about 'ratio' of the lines changed
+def modify_lines(rnd, lines, ratio):
+    result = []
+    for line in lines:
+        r = rnd.random()
+        if r < ratio / 3:
+            # delete line
+            continue
+        if r < 2 * ratio / 3:
+            result.append(line.replace(' ', '  ', 1).upper())
+        else:
+            result.append(line)
+        if r > 1 - ratio / 3:
+            # insert line
+            result.append(f'inserted {rnd.random()}\n')
+    return result
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure frame times while scrolling.')
+    parser.add_argument('--panes', type=int, default=4)
+    parser.add_argument('--lines', type=int, default=50000)
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--step', type=int, default=0, help='pixels per frame (default: a line)')
+    parser.add_argument('--width', type=int, default=3840)
+    parser.add_argument('--height', type=int, default=2160)
+    parser.add_argument(
+        '--spacers',
+        action='store_true',
+        help='keep only every tenth line in the first pane so it is 90%% spacing lines')
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    prefs = Preferences(os.path.join(tempfile.mkdtemp(), 'prefs'))
+    viewer = FileDiffViewerBase(args.panes, prefs)
+    lines = make_lines(rnd, args.lines)
+    for f in range(args.panes):
+        if f == 0:
+            viewer.replaceContents(f, lines[::10] if args.spacers else lines)
+        else:
+            viewer.replaceContents(f, modify_lines(rnd, lines, 0.1))
+
+    window = Gtk.Window(title='Scroll benchmark')
+    window.set_default_size(args.width, args.height)
+    window.connect('destroy', Gtk.main_quit)
+    window.add(viewer)
+    window.show_all()
+
+    step = args.step or viewer.font_height
+    paint_times = []
+    state = {'start': None, 'paint': 0.0, 'frames': 0}
+
+    def before_paint_cb(clock):
+        state['paint'] = time.perf_counter()
+
+    def after_paint_cb(clock):
+        if state['start'] is not None:
+            paint_times.append(time.perf_counter() - state['paint'])
+
+    # scroll by 'step' each frame like holding down the arrow key
+    def tick_cb(widget, clock):
+        if state['start'] is None:
+            state['start'] = time.perf_counter()
+        vadj = viewer.vadj
+        v = vadj.get_value() + step
+        if state['frames'] >= args.frames or v > vadj.get_upper() - vadj.get_page_size():
+            elapsed = time.perf_counter() - state['start']
+            report(paint_times, elapsed)
+            window.destroy()
+            return False
+        vadj.set_value(v)
+        state['frames'] += 1
+        return True
+
+    clock = window.get_frame_clock()
+    clock.connect('before-paint', before_paint_cb)
+    clock.connect('after-paint', after_paint_cb)
+    window.add_tick_callback(tick_cb)
+    Gtk.main()
+
+
+def report(paint_times, elapsed):
+    if not paint_times:
+        print('no frames were painted')
+        return
+    ms = [t * 1000 for t in paint_times]
+    print(f'frames: {len(ms)}  fps: {len(ms) / elapsed:.1f}')
+    print(f'paint ms: mean {sum(ms) / len(ms):.2f}  median {percentile(ms, 0.5):.2f}  '
+          f'p95 {percentile(ms, 0.95):.2f}  max {max(ms):.2f}')
+
+
+if __name__ == '__main__':
+    main()
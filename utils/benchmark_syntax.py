@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+# Diffuse: a graphical tool for merging and comparing text files.
+#
+# Copyright (C) 2019 Derrick Moser <derrick_moser@yahoo.com>
+# Copyright (C) 2021 Romain Failliot <romain.failliot@foolstep.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# This program measures the time taken to identify the syntax highlighting
+# tokens of source files using the syntax files from the source tree.  The
+# files from tests/syntax are used when no files are given.
+#
+# usage: benchmark_syntax.py [--syntax NAME] [--repeat N] [FILE ...]
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+# importing utils first avoids a circular import with resources
+from diffuse import utils  # noqa: E402,F401
+from diffuse.resources import theResources  # noqa: E402
+
+SYNTAX_FILES = os.path.join(ROOT, 'data', 'usr', 'share', 'diffuse', 'syntax', '*.syntax')
+TEST_FILES = os.path.join(ROOT, 'tests', 'syntax', '**', '*')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure syntax highlighting speed.')
+    parser.add_argument('--syntax', help='syntax used for all files (default: guessed)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('files', nargs='*')
+    args = parser.parse_args()
+
+    for path in sorted(glob.glob(SYNTAX_FILES)):
+        theResources.parse(path)
+    files = args.files or sorted(glob.glob(TEST_FILES, recursive=True))
+
+    total_chars, total_time = 0, 0.0
+    for path in files:
+        if not os.path.isfile(path):
+            continue
+        with open(path, encoding='utf-8', errors='replace') as f:
+            lines = f.readlines()
+        name = args.syntax or theResources.guessSyntaxForFile(path, lines)
+        syntax = theResources.getSyntax(name)
+        if syntax is None:
+            print(f'{path}: no syntax')
+            continue
+        # keep the best time to reduce the noise from other processes
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            state = syntax.initial_state
+            for s in lines:
+                state, blocks = syntax.parse(state, s)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        chars = sum(len(s) for s in lines)
+        total_chars += chars
+        total_time += best
+        print(f'{path} ({name}): {len(lines)} lines  {best * 1000:.2f} ms  '
+              f'{chars / max(best, 1e-9) / 1e6:.2f} Mchar/s')
+    if total_time > 0:
+        print(f'total: {total_chars} chars  {total_time * 1000:.2f} ms  '
+              f'{total_chars / total_time / 1e6:.2f} Mchar/s')
+
+
+if __name__ == '__main__':
+    main()